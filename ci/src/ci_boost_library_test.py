@@ -76,9 +76,10 @@ class script(script_common):
         if self.toolset:
             self.command_install_toolset(self.toolset)
         # Fetch the build log processor..
-        utils.web_get(
-            'https://raw.githubusercontent.com/boostorg/regression/develop/testing/src/build_log.py',
-            os.path.join(__dirname__, 'build_log.py'))
+        for script in [ 'bjam_log.py', 'build_log.py', 'duration_baseline.py', 'result_pack.py' ]:
+            utils.web_get(
+                'https://raw.githubusercontent.com/boostorg/regression/develop/testing/src/%s'%(script),
+                os.path.join(__dirname__, script))
     
     def command_before_build(self):
         script_common.command_before_build(self)
@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+
+# Distributed under the Boost Software License, Version 1.0.
+# (See accompanying file LICENSE_1_0.txt or copy at
+# http://www.boost.org/LICENSE_1_0.txt)
+
+import optparse
+import random
+import sys
+import time
+
+class LogGenerator(object):
+    '''
+    Writes a synthetic bjam --out-xml log with the same structure as a
+    regression run: the declared tests, the target dependency DAG, and the
+    build actions for each library test and toolset. Plus the library
+    builds, which don't correspond to tests.
+    '''
+
+    test_types = [ 'run', 'run', 'run', 'compile', 'link', 'run-fail', 'compile-fail' ]
+
+    def __init__(self, libraries = 10, tests = 20, toolsets = 2, fanout = 2,
+        output_size = 200, failure_rate = 0.05, seed = 0):
+        self.libraries = libraries
+        self.tests = tests
+        self.toolsets = toolsets
+        self.fanout = fanout
+        self.output_size = output_size
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.clock = time.mktime((2020,1,1,0,0,0,0,1,0))
+        self.stats = { 'elements' : 0, 'tests' : 0, 'targets' : 0, 'actions' : 0 }
+
+    def write(self, out):
+        '''
+        Write the log, and return the counts of what was written.
+        '''
+        self.out = out
+        out.write('<?xml version="1.0" encoding="utf-8"?>\n')
+        out.write('<build format="1.0" version="4.0">\n')
+        self.element('os','Linux bench 4.0.0 x86_64',name='LINUX',platform='X86_64')
+        self.element('directory','/boost')
+        self.element('timestamp',self.timestamp(self.clock))
+        for (library,test,test_type) in self.each_test():
+            self.declare_test(library,test,test_type)
+        out.write('<targets>\n')
+        self.count()
+        for toolset in self.each_toolset():
+            for library in self.each_library():
+                self.library_targets(library,toolset)
+            for (library,test,test_type) in self.each_test():
+                self.test_targets(library,test,test_type,toolset)
+        out.write('</targets>\n')
+        for toolset in self.each_toolset():
+            for library in self.each_library():
+                self.library_actions(library,toolset)
+            for (library,test,test_type) in self.each_test():
+                self.test_actions(library,test,test_type,toolset)
+        out.write('</build>\n')
+        self.count()
+        return self.stats
+
+    def each_library(self):
+        for l in range(0,self.libraries):
+            yield 'lib%03d' % l
+
+    def each_test(self):
+        for library in self.each_library():
+            for t in range(0,self.tests):
+                yield (library,'test%03d' % t,self.test_types[t % len(self.test_types)])
+
+    def each_toolset(self):
+        for t in range(0,self.toolsets):
+            yield ('gcc','%d' % (5+t))
+
+    def declare_test(self, library, test, test_type):
+        self.stats['tests'] += 1
+        self.out.write('<test name="%s/%s" type="%s">' % (library,test,test_type))
+        self.element('target','libs/%s/test/%s.test' % (library,test))
+        self.element('info','')
+        self.element('source','libs/%s/test/%s.cpp' % (library,test))
+        self.out.write('</test>\n')
+        self.count()
+
+    def build_dir(self, path, toolset):
+        return 'bin.v2/%s/%s-%s/debug' % (path,toolset[0],toolset[1])
+
+    def target(self, name, path, target, dependencies):
+        self.stats['targets'] += 1
+        self.out.write('<target>')
+        self.element('name',name)
+        self.element('jam-target','<p%s>%s' % (path,target))
+        self.element('path',path)
+        self.out.write('<dependencies>')
+        for dependency in dependencies:
+            self.element('dependency','object(file-target)@%d//%s' % (self.stats['targets'],dependency))
+        self.out.write('</dependencies>')
+        self.count()
+        self.out.write('</target>\n')
+        self.count()
+
+    def objects(self, base):
+        return [ '%s_%d.o' % (base,i) for i in range(0,self.fanout) ]
+
+    def library_targets(self, library, toolset):
+        path = self.build_dir('libs/%s/build' % library,toolset)
+        objects = self.objects(library)
+        self.target('libs/%s/build/boost_%s' % (library,library),path,'libboost_%s.a' % library,objects)
+        for o in objects:
+            self.target(o,path,o,[])
+
+    def test_targets(self, library, test, test_type, toolset):
+        path = self.build_dir('libs/%s/test/%s.test' % (library,test),toolset)
+        objects = self.objects(test)
+        if test_type.startswith('run'):
+            self.target('libs/%s/test/%s.test' % (library,test),path,'%s.test' % test,[test+'.run'])
+            self.target(test+'.run',path,test+'.run',[test])
+            self.target(test,path,test,objects)
+        elif test_type.startswith('link'):
+            self.target('libs/%s/test/%s.test' % (library,test),path,'%s.test' % test,[test])
+            self.target(test,path,test,objects)
+        else:
+            self.target('libs/%s/test/%s.test' % (library,test),path,'%s.test' % test,objects[0:1])
+            objects = objects[0:1]
+        for o in objects:
+            self.target(o,path,o,[])
+
+    def library_actions(self, library, toolset):
+        path = self.build_dir('libs/%s/build' % library,toolset)
+        for o in self.objects(library):
+            self.action('gcc%gcc.compile.c++',path,o,toolset,failed=False)
+        self.action('gcc%gcc.archive',path,'libboost_%s.a' % library,toolset,failed=False)
+
+    def test_actions(self, library, test, test_type, toolset):
+        path = self.build_dir('libs/%s/test/%s.test' % (library,test),toolset)
+        failed = self.random.random() < self.failure_rate
+        expected = not test_type.endswith('-fail')
+        #~ The last step of "-fail" tests is expected to fail, and the
+        #~ test fails when it doesn't.
+        last_failed = failed != (not expected)
+        objects = self.objects(test)
+        if test_type.startswith('compile'):
+            objects = objects[0:1]
+        status = 0
+        for o in objects:
+            status = self.action('gcc%gcc.compile.c++',path,o,toolset,
+                failed=failed if not test_type.startswith('compile') else last_failed)
+            if status:
+                break
+        if not status and not test_type.startswith('compile'):
+            status = self.action('gcc%gcc.link',path,test,toolset,
+                failed=failed if test_type.startswith('run') else last_failed)
+            if not status and test_type.startswith('run'):
+                status = self.action('testing%testing.capture-output',path,test+'.run',toolset,
+                    failed=last_failed)
+        if expected:
+            rule = 'testing%testing.expect-success'
+            result_failed = status != 0
+        else:
+            rule = 'testing%testing.expect-failure'
+            result_failed = status == 0
+        self.action(rule,path,test+'.test',toolset,failed=result_failed,output=False)
+
+    def action(self, rule, path, target, toolset, failed, output = True):
+        self.stats['actions'] += 1
+        start = self.clock
+        duration = self.random.expovariate(1.0)
+        self.clock += duration/4
+        status = 0
+        if failed:
+            status = 1
+        self.out.write('<action status="%d" start="%s" end="%s" user="%f" system="%f">' % (
+            status,self.timestamp(start),self.timestamp(start+duration),
+            duration*0.9,duration*0.05))
+        self.element('name',rule)
+        self.element('path','/boost/%s/%s' % (path,target))
+        self.element('jam-target','<p%s>%s' % (path,target))
+        self.element('command','"g++" -c -x c++ -O0 -g -Wall -I"." -o "%s/%s" "%s.cpp"' % (path,target,target))
+        if output:
+            self.element('output',self.output(failed))
+        else:
+            self.element('output','')
+        self.out.write('<properties>')
+        self.property('toolset',toolset[0])
+        self.property('toolset-%s:version' % toolset[0],toolset[1])
+        self.property('variant','debug')
+        self.property('define','BOOST_ALL_NO_LIB=1')
+        self.property('define','BOOST_BENCH_%s' % toolset[1])
+        self.property('test-info','')
+        self.out.write('</properties>')
+        self.count()
+        self.out.write('</action>\n')
+        self.count()
+        return status
+
+    def property(self, name, value):
+        self.out.write('<property name="%s"><![CDATA[%s]]></property>' % (name,value))
+        self.count()
+
+    def output(self, failed):
+        size = int(self.random.expovariate(1.0/self.output_size))
+        if failed:
+            size *= 10
+        line = 'warning: comparison of integers of different signs: <int> and <unsigned int> [-Wsign-compare]\n'
+        return (line*(size/len(line)+1))[0:size]
+
+    def element(self, tag, text, **attributes):
+        self.out.write('<%s' % tag)
+        for (k,v) in sorted(attributes.items()):
+            self.out.write(' %s="%s"' % (k,v))
+        self.out.write('><![CDATA[%s]]></%s>' % (text,tag))
+        self.count()
+
+    def count(self):
+        self.stats['elements'] += 1
+
+    def timestamp(self, t):
+        return '%s.%09dZ' % (
+            time.strftime('%Y-%m-%d %H:%M:%S',time.gmtime(t)),
+            int((t-int(t))*1000000000))
+
+def main(args=None):
+    opt = optparse.OptionParser(
+        usage="%prog [options] [output]")
+    opt.add_option( '--libraries', type='int', default=10,
+        help="number of libraries" )
+    opt.add_option( '--tests', type='int', default=20,
+        help="number of tests per library" )
+    opt.add_option( '--toolsets', type='int', default=2,
+        help="number of toolsets to build the tests with" )
+    opt.add_option( '--fanout', type='int', default=2,
+        help="number of object files for each test and library" )
+    opt.add_option( '--output-size', type='int', default=200,
+        help="average size in bytes of the output of an action" )
+    opt.add_option( '--failure-rate', type='float', default=0.05,
+        help="fraction of tests that fail" )
+    opt.add_option( '--seed', type='int', default=0 )
+    ( options, outputs ) = opt.parse_args(args)
+    if outputs:
+        out = open(outputs[0],'w')
+    else:
+        out = sys.stdout
+    stats = LogGenerator(
+        libraries=options.libraries, tests=options.tests,
+        toolsets=options.toolsets, fanout=options.fanout,
+        output_size=options.output_size, failure_rate=options.failure_rate,
+        seed=options.seed).write(out)
+    if out is not sys.stdout:
+        out.close()
+    sys.stderr.write("%(elements)d elements, %(tests)d tests, %(targets)d targets, %(actions)d actions\n" % stats)
+
+if __name__ == '__main__':
+    main()
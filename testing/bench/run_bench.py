@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+
+# Distributed under the Boost Software License, Version 1.0.
+# (See accompanying file LICENSE_1_0.txt or copy at
+# http://www.boost.org/LICENSE_1_0.txt)
+
+import json
+import optparse
+import os
+import os.path
+import subprocess
+import sys
+import tempfile
+import time
+
+from generate_log import LogGenerator
+
+bench_dir = os.path.abspath(os.path.dirname(__file__))
+src_dir = os.path.join(os.path.dirname(bench_dir),'src')
+
+#~ The synthetic logs, by name, as the arguments to the LogGenerator.
+scenarios = {
+    'small' : { 'libraries' : 10, 'tests' : 20, 'toolsets' : 2 },
+    'medium' : { 'libraries' : 40, 'tests' : 40, 'toolsets' : 3 },
+    'large' : { 'libraries' : 150, 'tests' : 50, 'toolsets' : 4 },
+    }
+
+#~ The log processors and configurations to measure. Each is the script
+#~ and the arguments for it, with the input log appended at the end.
+processors = {
+    'pjl-pulldom' : [ 'process_jam_log.py', '--engine=pulldom',
+        '--output=%(output)s', '--runner=bench', '--comment=%(comment)s' ],
+    'pjl-iterparse' : [ 'process_jam_log.py', '--engine=iterparse',
+        '--output=%(output)s', '--runner=bench', '--comment=%(comment)s' ],
+    'pjl-iterparse-stream' : [ 'process_jam_log.py', '--engine=iterparse', '--stream',
+        '--output=%(output)s', '--runner=bench', '--comment=%(comment)s' ],
+    'build_log-console' : [ 'build_log.py', '--output=console' ],
+    'build_log-bounded' : [ 'build_log.py', '--output=console', '--bounded-output' ],
+    }
+
+#~ The exit statuses of the scripts that mean they processed the whole log.
+#~ build_log.py exits with -1, seen as 255, when the log has failed tests.
+completed_status = {
+    'build_log.py' : (0,255),
+    }
+
+class Bench(object):
+    '''
+    Measures the wall time, peak RSS, and element events per second, of the
+    bjam log processors on synthetic logs. And compares them to, or saves
+    them as, the stored baselines.
+    '''
+
+    def __init__(self, args=None):
+        opt = optparse.OptionParser(
+            usage="%prog [options] [scenario...]")
+        opt.add_option( '--work-dir',
+            help="directory for the generated logs and outputs",
+            default=os.path.join(tempfile.gettempdir(),'boost-regression-bench') )
+        opt.add_option( '--scale', type='int', default=1,
+            help="multiply the number of libraries of the scenarios" )
+        opt.add_option( '--processor', action='append',
+            help="only run the given processor, can be repeated" )
+        opt.add_option( '--repeat', type='int', default=1,
+            help="run each processor this many times, and keep the fastest" )
+        opt.add_option( '--baseline',
+            help="the baselines file",
+            default=os.path.join(bench_dir,'baselines.json') )
+        opt.add_option( '--save-baseline',
+            help="store the results as the baselines",
+            action='store_true' )
+        opt.add_option( '--python', default=sys.executable,
+            help="the Python interpreter to run the processors with" )
+        ( self.opt, self.scenarios ) = opt.parse_args(args)
+        if not self.scenarios:
+            self.scenarios = [ 'small', 'medium' ]
+        if not os.path.exists(self.opt.work_dir):
+            os.makedirs(self.opt.work_dir)
+        self.comment = os.path.join(self.opt.work_dir,'comment.html')
+        open(self.comment,'w').close()
+        self.baselines = {}
+        if os.path.exists(self.opt.baseline):
+            self.baselines = json.load(open(self.opt.baseline))
+        self.results = {}
+        for scenario in self.scenarios:
+            self.run_scenario(scenario)
+        if self.opt.save_baseline:
+            self.baselines.update(self.results)
+            out = open(self.opt.baseline,'w')
+            json.dump(self.baselines,out,indent=2,sort_keys=True)
+            out.write('\n')
+            out.close()
+
+    def run_scenario(self, scenario):
+        (log, stats) = self.generate(scenario)
+        key = self.key(scenario)
+        self.results[key] = {}
+        print "%s: %d MB, %d elements, %d tests, %d actions" % (
+            key,os.path.getsize(log)/(1024*1024),
+            stats['elements'],stats['tests'],stats['actions'])
+        print "  %-24s %10s %10s %14s   %s" % ('processor','time (s)','RSS (MB)','events/s','vs. baseline')
+        for processor in sorted(processors.keys()):
+            if self.opt.processor and processor not in self.opt.processor:
+                continue
+            result = None
+            for i in range(0,self.opt.repeat):
+                r = self.measure(processor,log)
+                if not result or r['time'] < result['time']:
+                    result = r
+            result['events-per-second'] = stats['elements']/max(result['time'],0.001)
+            self.results[key][processor] = result
+            print "  %-24s %10.2f %10.1f %14.0f   %s" % (
+                processor,result['time'],result['rss']/1024.0,
+                result['events-per-second'],self.compare(key,processor,result))
+
+    def key(self, scenario):
+        if self.opt.scale != 1:
+            return '%s-x%d' % (scenario,self.opt.scale)
+        return scenario
+
+    def generate(self, scenario):
+        '''
+        Generate the log for the scenario, unless it was already generated.
+        '''
+        log = os.path.join(self.opt.work_dir,'%s.xml' % self.key(scenario))
+        stats_file = log+'.json'
+        if not os.path.exists(log) or not os.path.exists(stats_file):
+            args = dict(scenarios[scenario])
+            args['libraries'] *= self.opt.scale
+            out = open(log,'w')
+            stats = LogGenerator(**args).write(out)
+            out.close()
+            json.dump(stats,open(stats_file,'w'))
+        return (log,json.load(open(stats_file)))
+
+    def measure(self, processor, log):
+        '''
+        Run the processor on the log in a child process, and measure the wall
+        time and peak resident set size of the child.
+        '''
+        args = [ self.opt.python,os.path.join(src_dir,processors[processor][0]) ]
+        for arg in processors[processor][1:]:
+            args.append(arg % {
+                'output' : os.path.join(self.opt.work_dir,'%s.out.xml' % processor),
+                'comment' : self.comment })
+        args.append(log)
+        devnull = open(os.devnull,'w')
+        start = time.time()
+        child = subprocess.Popen(args,stdout=devnull)
+        rss = 0
+        if hasattr(os,'wait4'):
+            (pid,status,usage) = os.wait4(child.pid,0)
+            rss = usage.ru_maxrss
+            if os.WIFSIGNALED(status):
+                returncode = -os.WTERMSIG(status)
+            else:
+                returncode = os.WEXITSTATUS(status)
+        else:
+            returncode = child.wait()
+        elapsed = time.time()-start
+        devnull.close()
+        #~ A processor that fails part way would be timed on only part of
+        #~ the log, which makes the run worthless.
+        if returncode not in completed_status.get(processors[processor][0],(0,)):
+            raise SystemExit("%s failed on '%s' with exit status %d" % (
+                processor,log,returncode))
+        return { 'time' : elapsed, 'rss' : rss }
+
+    def compare(self, key, processor, result):
+        baseline = self.baselines.get(key,{}).get(processor)
+        if not baseline:
+            return '-'
+        return "time x%.2f, RSS x%.2f" % (
+            result['time']/max(baseline['time'],0.001),
+            float(result['rss'])/max(baseline['rss'],1))
+
+if __name__ == '__main__':
+    Bench()
@@ -0,0 +1,1118 @@
+#!/usr/bin/env python
+
+# Distributed under the Boost Software License, Version 1.0.
+# (See accompanying file LICENSE_1_0.txt or copy at
+# http://www.boost.org/LICENSE_1_0.txt)
+
+'''
+Common support for processing the Boost Build (bjam) XML output log, as
+produced with the --out-xml option. Shared by process_jam_log.py and
+build_log.py.
+'''
+
+import bz2
+import calendar
+import cPickle
+import hashlib
+import os
+import re
+import sys
+import time
+import xml.dom
+import zlib
+from array import array
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+class HandlerRegistry(object):
+    '''
+    Dispatch table from element paths in the bjam XML log to the handlers
+    for them. A path is the tuple of element names from the root element
+    down to the element, for example ('build','targets','target').
+
+    Handlers are registered for a path suffix, and the longest registered
+    suffix matching a path wins. For compatibility with the x_* handler
+    methods, an owner object can be given in which case the methods named
+    after the path suffix, with '-' and '#' replaced by '_', are also
+    found. For example 'x_build_targets_target', or 'x_targets_target'.
+
+    The resolution is done once per distinct path and memoized. Hence
+    dispatching an element costs a single dictionary lookup.
+    '''
+
+    def __init__(self, owner = None, stats = False):
+        self.owner = owner
+        self.handlers = {}
+        self.resolved = {}
+        self.hits = None
+        if stats:
+            self.hits = {}
+
+    def register(self, path, handler):
+        '''
+        Register the handler for the given path suffix. The path can be given
+        as a tuple of element names, or as a '/' separated string.
+        '''
+        if isinstance(path, basestring):
+            path = path.split('/')
+        self.handlers[tuple(path)] = handler
+        self.resolved.clear()
+
+    def resolve(self, path):
+        '''
+        The handler for the given path tuple, or None if there is none.
+        '''
+        if self.hits is not None:
+            self.hits[path] = self.hits.get(path,0)+1
+        try:
+            return self.resolved[path]
+        except KeyError:
+            handler = self.resolved[path] = self.find(path)
+            return handler
+
+    def find(self, path):
+        for i in range(0,len(path)):
+            suffix = path[i:]
+            if suffix in self.handlers:
+                return self.handlers[suffix]
+            if self.owner:
+                name = 'x_'+'_'.join(suffix).replace('-','_').replace('#','_')
+                handler = getattr(self.owner,name,None)
+                if handler:
+                    return handler
+        return None
+
+    def print_stats(self, out = None):
+        '''
+        Print the per-path hit counts, when enabled, in decreasing order.
+        '''
+        if self.hits is None:
+            return
+        if not out:
+            out = sys.stderr
+        out.write("Dispatch statistics:\n")
+        for (path,count) in sorted(self.hits.items(),key=lambda x: (-x[1],x[0])):
+            if path in self.resolved and self.resolved[path]:
+                handled = '*'
+            else:
+                handled = ' '
+            out.write("%12d %s %s\n" % (count,handled,'/'.join(path)))
+
+class StringTable(object):
+    '''
+    Interns strings, so that the many equal strings of a log share a single
+    object. The builtin intern only handles byte strings, while the XML
+    parsers mostly produce unicode strings.
+    '''
+
+    def __init__(self):
+        self.strings = {}
+
+    def __call__(self, string):
+        return self.strings.setdefault(string,string)
+
+    def __len__(self):
+        return len(self.strings)
+
+class Profiler(object):
+    '''
+    Invocation counts and wall times of the handlers and helpers of a log
+    processor. Functions are profiled by replacing them with timing
+    wrappers, hence nothing is measured, nor costs anything, unless
+    profiling was asked for.
+
+    For each profiled name this keeps the number of calls, the cumulative
+    and the maximum wall time of a call, and optionally the bytes of data
+    handled as computed from the result of each call. Cumulative times
+    include the time of nested profiled calls.
+    '''
+
+    def __init__(self):
+        self.entries = {}
+        self.start = time.time()
+
+    def entry(self, name):
+        return self.entries.setdefault(name,[0,0.0,0.0,0])
+
+    def wrap(self, name, function, size = None):
+        '''
+        A wrapper of the function that profiles the calls to it under the
+        name. The size, if given, is called with the result of each call
+        to get the number of bytes handled.
+        '''
+        entry = self.entry(name)
+        timer = time.time
+        def profiled(*args, **kwargs):
+            start = timer()
+            result = function(*args,**kwargs)
+            elapsed = timer()-start
+            entry[0] += 1
+            entry[1] += elapsed
+            if elapsed > entry[2]:
+                entry[2] = elapsed
+            if size:
+                entry[3] += size(result)
+            return result
+        return profiled
+
+    def instrument(self, owner, names, sizes = None):
+        '''
+        Replace the named functions of the owner, an object or module, with
+        profiled ones. The sizes map names to the size function for them.
+        '''
+        if not sizes:
+            sizes = {}
+        for name in names:
+            function = getattr(owner,name,None)
+            if function:
+                setattr(owner,name,self.wrap(name,function,sizes.get(name)))
+
+    def instrument_handlers(self, owner):
+        '''
+        Profile all the x_* element handlers of the owner.
+        '''
+        self.instrument(owner,[ name for name in dir(owner)
+            if name.startswith('x_') and callable(getattr(owner,name)) ])
+
+    def iterate(self, name, iterable):
+        '''
+        Iterate over the iterable, profiling the production of each item.
+        For example the events of an XML parser.
+        '''
+        entry = self.entry(name)
+        timer = time.time
+        items = iter(iterable)
+        while True:
+            start = timer()
+            try:
+                item = items.next()
+            except StopIteration:
+                return
+            elapsed = timer()-start
+            entry[0] += 1
+            entry[1] += elapsed
+            if elapsed > entry[2]:
+                entry[2] = elapsed
+            yield item
+
+    def stats(self):
+        '''
+        The profiled names with their counts and times, in decreasing order
+        of cumulative time.
+        '''
+        stats = []
+        for (name,(count,total,maximum,size)) in self.entries.items():
+            if count:
+                stats.append({
+                    'name' : name,
+                    'count' : count,
+                    'cumulative' : total,
+                    'max' : maximum,
+                    'bytes' : size })
+        stats.sort(key=lambda x: (-x['cumulative'],x['name']))
+        return stats
+
+    def report(self, out = None):
+        '''
+        Print the table of the profiled names.
+        '''
+        if not out:
+            out = sys.stderr
+        out.write("Profile, %.3fs in total:\n" % (time.time()-self.start))
+        out.write("%10s %12s %12s %12s %12s  %s\n" % (
+            'calls','cumul (s)','mean (us)','max (ms)','bytes','name'))
+        for s in self.stats():
+            out.write("%10d %12.3f %12.1f %12.3f %12d  %s\n" % (
+                s['count'],s['cumulative'],s['cumulative']*1000000.0/s['count'],
+                s['max']*1000.0,s['bytes'],s['name']))
+
+    def save(self, path):
+        '''
+        Write the profile as JSON to the file at the path.
+        '''
+        import json
+        out = open(path,'w')
+        json.dump({ 'total' : time.time()-self.start, 'entries' : self.stats() },
+            out,indent=1)
+        out.close()
+
+class TargetGraph(object):
+    '''
+    The build target dependency DAG from the <targets> section of the log,
+    used to find which top-level library or test target a build action
+    belongs to.
+
+    Jam targets are interned to integer ids. Each id has the virtual target
+    name and path, and the id of its parent in an array. The paths, which
+    many targets share, are interned. The root for every
+    target is computed in one pass, with path compression, the first time
+    it's needed after targets were added. After which resolving the root
+    of a target is an array lookup.
+
+    Optionally all the dependencies of each target are kept, as arrays of
+    ids, for analyses of the whole DAG.
+    '''
+
+    def __init__(self, dependencies = False):
+        self.ids = {}
+        self.names = []
+        self.paths = []
+        self.parents = array('l')
+        self.roots = None
+        self.strings = StringTable()
+        self.dependencies = None
+        if dependencies:
+            self.dependencies = {}
+
+    def id(self, jam_target):
+        '''
+        The id for the jam target, allocating a new one if needed.
+        '''
+        try:
+            return self.ids[jam_target]
+        except KeyError:
+            i = self.ids[jam_target] = len(self.names)
+            self.names.append(None)
+            self.paths.append(None)
+            self.parents.append(-1)
+            self.roots = None
+            return i
+
+    def add_target(self, jam_target, name, path, dependencies):
+        '''
+        Add a target, and make it the parent of its dependencies. The
+        dependencies are given as listed in the log, and are resolved
+        relative to the path of the target.
+        '''
+        i = self.id(jam_target)
+        self.names[i] = name
+        self.paths[i] = self.strings(path)
+        children = array('l')
+        for child in dependencies:
+            child_jam_target = '<p%s>%s' % (path,child.split('//',1)[1])
+            c = self.id(child_jam_target)
+            self.parents[c] = i
+            children.append(c)
+        if self.dependencies is not None:
+            self.dependencies[i] = children
+        self.roots = None
+
+    def __contains__(self, jam_target):
+        i = self.ids.get(jam_target)
+        return i is not None and self.names[i] is not None
+
+    def __len__(self):
+        return len(self.names)
+
+    def name(self, jam_target):
+        '''
+        The virtual target name of the jam target.
+        '''
+        return self.target_name(self.ids[jam_target])
+
+    def root_name(self, jam_target):
+        '''
+        The virtual target name of the top-most ancestor of the jam target.
+        '''
+        return self.target_name(self.root(self.ids[jam_target]))
+
+    def target_name(self, i):
+        name = self.names[i]
+        if name is None:
+            raise KeyError(i)
+        return name
+
+    def root(self, i):
+        '''
+        The id of the top-most ancestor of the target id.
+        '''
+        if self.roots is None:
+            self.compute_roots()
+        return self.roots[i]
+
+    def longest_path(self, weights):
+        '''
+        The heaviest chain of dependencies, given the weight of the targets
+        by id. Returned as the total weight and the list of target ids from
+        the top target down. Needs the dependencies to be kept. Dependency
+        cycles are broken where found.
+        '''
+        dependencies = self.dependencies
+        count = len(self.names)
+        unknown = 0
+        visiting = 1
+        done = 2
+        state = array('b',[unknown])*count
+        total = array('d',[0.0])*count
+        heaviest = array('l',[-1])*count
+        for top in xrange(count):
+            if state[top] != unknown:
+                continue
+            state[top] = visiting
+            stack = [(top,iter(dependencies.get(top,())))]
+            while stack:
+                (i,children) = stack[-1]
+                for c in children:
+                    if state[c] == unknown:
+                        state[c] = visiting
+                        stack.append((c,iter(dependencies.get(c,()))))
+                        break
+                else:
+                    stack.pop()
+                    for c in dependencies.get(i,()):
+                        if state[c] == done and (heaviest[i] < 0 or total[c] > total[heaviest[i]]):
+                            heaviest[i] = c
+                    total[i] = weights.get(i,0.0)
+                    if heaviest[i] >= 0:
+                        total[i] += total[heaviest[i]]
+                    state[i] = done
+        if not count:
+            return (0.0,[])
+        i = max(xrange(count),key=total.__getitem__)
+        path = []
+        while i >= 0:
+            path.append(i)
+            i = heaviest[i]
+        return (total[path[0]],path)
+
+    def compute_roots(self):
+        parents = self.parents
+        unknown = -2
+        visiting = -3
+        roots = array('l',[unknown])*len(parents)
+        for i in xrange(len(parents)):
+            chain = []
+            j = i
+            while roots[j] == unknown and parents[j] != -1:
+                roots[j] = visiting
+                chain.append(j)
+                j = parents[j]
+            if roots[j] == unknown or roots[j] == visiting:
+                # A root, or a dependency cycle which we break here.
+                roots[j] = j
+            root = roots[j]
+            for j in chain:
+                roots[j] = root
+        self.roots = roots
+
+class ActionScanner(object):
+    '''
+    Finds the byte ranges of the top level <action> elements of a log
+    without parsing it. The data is anything supporting the buffer
+    interface, usually an mmap of the log file. Only CDATA sections and
+    comments need to be skipped over as actions don't nest.
+    '''
+
+    token_re = re.compile(r'<!\[CDATA\[|<!--|<action[\s>]|</action\s*>')
+
+    def __init__(self, data):
+        self.data = data
+
+    def scan(self, start = 0):
+        '''
+        Generates the (begin,end) ranges of the complete actions from the start
+        offset. An action that is cut short at the end of the data is not
+        generated.
+        '''
+        data = self.data
+        token_re = self.token_re
+        pos = start
+        begin = None
+        while True:
+            token = token_re.search(data,pos)
+            if not token:
+                return
+            t = token.group()
+            if t == '<![CDATA[':
+                pos = data.find(']]>',token.end())
+                if pos < 0:
+                    return
+                pos += 3
+            elif t == '<!--':
+                pos = data.find('-->',token.end())
+                if pos < 0:
+                    return
+                pos += 3
+            elif t.startswith('<action'):
+                begin = token.start()
+                pos = token.end()
+            else:
+                if begin is not None:
+                    yield (begin,token.end())
+                begin = None
+                pos = token.end()
+
+    def ranges(self, start = 0):
+        '''
+        The begin and end offsets of the actions as two compact arrays.
+        '''
+        begins = array('l')
+        ends = array('l')
+        for (begin,end) in self.scan(start):
+            begins.append(begin)
+            ends.append(end)
+        return (begins,ends)
+
+class SegmentReader(object):
+    '''
+    A file like reader over a sequence of (begin,end) ranges of a buffer,
+    as if the ranges were a single contiguous file. Strings can also be given
+    in the sequence, which are read as they are.
+    '''
+
+    def __init__(self, data, segments):
+        self.data = data
+        self.segments = iter(segments)
+        self.buffer = data
+        self.pos = 0
+        self.end = 0
+
+    def read(self, size = -1):
+        result = []
+        while size != 0:
+            if self.pos >= self.end:
+                try:
+                    segment = self.segments.next()
+                except StopIteration:
+                    break
+                if isinstance(segment,basestring):
+                    (self.buffer,self.pos,self.end) = (segment,0,len(segment))
+                else:
+                    self.buffer = self.data
+                    (self.pos,self.end) = segment
+                continue
+            if size < 0:
+                n = self.end-self.pos
+            else:
+                n = min(size,self.end-self.pos)
+                size -= n
+            result.append(self.buffer[self.pos:self.pos+n])
+            self.pos += n
+        return ''.join(result)
+
+class FollowReader(object):
+    '''
+    A file like reader of a log that is still being written, as when
+    following the --out-xml log of a running build. Reading at the end of
+    the file waits for more to be written, or for the file to be created.
+
+    The log ends when the closing </build> tag has been read, in which case
+    it's complete. Or when nothing was written for the idle timeout, in
+    which case the document may not be closed and the parser will fail at
+    its end. Which the caller should tolerate when the log isn't complete.
+    '''
+
+    end_re = re.compile(r'</build\s*>\s*$')
+
+    def __init__(self, path, idle_timeout = 600.0, poll_interval = 0.5):
+        self.path = path
+        self.idle_timeout = idle_timeout
+        self.poll_interval = poll_interval
+        self.fd = None
+        self.tail = ''
+        self.complete = False
+        self.done = False
+
+    def read(self, size = -1):
+        if size < 0:
+            size = 64*1024
+        idle_start = time.time()
+        while not self.done:
+            if self.fd is None and os.path.exists(self.path):
+                self.fd = os.open(self.path,os.O_RDONLY)
+            if self.fd is not None:
+                data = os.read(self.fd,size)
+                if data:
+                    self.tail = (self.tail+data)[-64:]
+                    if self.end_re.search(self.tail):
+                        self.complete = self.done = True
+                    return data
+            if time.time()-idle_start >= self.idle_timeout:
+                self.done = True
+            else:
+                time.sleep(self.poll_interval)
+        return ''
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+class DecompressReader(object):
+    '''
+    A file like reader of the decompressed content of a compressed file.
+    The file is read in large chunks, each decompressed in one go, so that
+    the decompression costs little more than the reading. Files of more
+    than one compressed stream, as when compressed logs are appended, are
+    read as the concatenation of the streams.
+    '''
+
+    def __init__(self, path, decompressor, chunk_size = 1024*1024):
+        self.f = open(path,'rb')
+        self.new_decompressor = decompressor
+        self.decompressor = decompressor()
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def read(self, size = -1):
+        while not self.eof and (size < 0 or len(self.buffer)-self.pos < size):
+            self.fill()
+        if size < 0:
+            size = len(self.buffer)-self.pos
+        data = self.buffer[self.pos:self.pos+size]
+        self.pos += len(data)
+        return data
+
+    def fill(self):
+        data = self.f.read(self.chunk_size)
+        if not data:
+            self.eof = True
+            return
+        chunks = [ self.buffer[self.pos:] ]
+        while data:
+            try:
+                chunks.append(self.decompressor.decompress(data))
+            except EOFError:
+                #~ The bz2 and lzma decompressors refuse data past the end of
+                #~ their stream, which is the start of the next stream.
+                self.decompressor = self.new_decompressor()
+                continue
+            data = getattr(self.decompressor,'unused_data','')
+            if data:
+                self.decompressor = self.new_decompressor()
+        self.buffer = ''.join(chunks)
+        self.pos = 0
+
+    def close(self):
+        self.f.close()
+
+def _gzip_decompressor():
+    return zlib.decompressobj(16+zlib.MAX_WBITS)
+
+def _xz_decompressor():
+    return lzma.LZMADecompressor()
+
+#~ The magic bytes at the start of compressed files, and the decompressor
+#~ for each.
+_compressions = [
+    ('gzip','\x1f\x8b',_gzip_decompressor),
+    ('bzip2','BZh',bz2.BZ2Decompressor),
+    ('xz','\xfd7zXZ\x00',_xz_decompressor),
+    ]
+
+def log_compression(path):
+    '''
+    The compression of the log file, 'gzip', 'bzip2', or 'xz', from its
+    magic bytes. Or None for a plain log.
+    '''
+    f = open(path,'rb')
+    magic = f.read(6)
+    f.close()
+    for (name,prefix,decompressor) in _compressions:
+        if magic.startswith(prefix):
+            return name
+    return None
+
+def open_log(path):
+    '''
+    The source to parse a log from. Which is the path itself for a plain
+    log, or a reader of its decompressed content for a compressed one.
+    '''
+    compression = log_compression(path)
+    for (name,prefix,decompressor) in _compressions:
+        if name == compression:
+            if name == 'xz' and lzma is None:
+                raise IOError("'%s' is xz compressed, which needs the lzma module" % path)
+            return DecompressReader(path,decompressor)
+    return path
+
+def complement_ranges(begins, ends, size):
+    '''
+    The ranges in between, and around, the given ranges of data of the given
+    size.
+    '''
+    pos = 0
+    for i in xrange(len(begins)):
+        if begins[i] > pos:
+            yield (pos,begins[i])
+        pos = ends[i]
+    if size > pos:
+        yield (pos,size)
+
+_document_tag_re = re.compile(r'<\?xml[^>]*\?>|<build(\s[^>]*)?>|</build\s*>')
+
+def resume_segments(data, start):
+    '''
+    The segments of the log data from the start offset, for a SegmentReader,
+    read as the content of a single <build> element. This is for resuming
+    the processing of a log at the end of an action. What follows the
+    action can be the rest of the build element, or more logs appended to
+    it, whose XML declarations and build tags are left out.
+    '''
+    yield '<build>'
+    pos = start
+    for (begin,end) in ActionScanner(data).scan(start):
+        for segment in _strip_document_tags(data,pos,begin):
+            yield segment
+        yield (begin,end)
+        pos = end
+    for segment in _strip_document_tags(data,pos,len(data)):
+        yield segment
+    yield '</build>'
+
+def _strip_document_tags(data, begin, end):
+    pos = begin
+    for tag in _document_tag_re.finditer(data,begin,end):
+        if tag.start() > pos:
+            yield (pos,tag.start())
+        pos = tag.end()
+    if end > pos:
+        yield (pos,end)
+
+def last_action_end(data):
+    '''
+    The offset just past the last action of the log data, or 0 if there are
+    no actions.
+    '''
+    pos = data.rfind('</action')
+    if pos < 0:
+        return 0
+    return data.find('>',pos)+1
+
+class ActionClassifier(object):
+    '''
+    Classifies build actions into result categories by their rule name.
+    Rule names are of the form 'module%rule', for example
+    'gcc%gcc.compile.c++' or 'testing%testing.capture-output'. The rule
+    is looked up in a table of rules, then by its module and action, as
+    in 'testing.capture-output', then by its action alone, as in
+    'compile', and then by its module for the extra mappings of modules.
+    Anything else is matched with a fallback pattern, and otherwise gets
+    the default category. The result for each distinct rule name is memoized, so
+    classifying is a dictionary lookup.
+
+    Extra mappings are given as 'rule=category', where the rule is one of:
+
+    * 'module.*', as in 'doxygen.*', for all the actions of the module.
+    * 'module.action', as in 'msvc.compile.c++.pch', for the rule, or the
+      action of the module, as in 'doxygen.run'.
+    * A name without a '.', as in 'doxygen' or 'archive', for the action
+      of that name in any module, and for all the actions of the module of
+      that name. The built-in action names aren't matched with modules,
+      so b2's own 'link' module isn't taken for links.
+
+    The most specific mapping matching an action wins, whether it's extra
+    or built in. An empty category makes the matching actions not be
+    classified at all.
+    '''
+
+    rules = {
+        'testing.capture-output' : 'run',
+        'testing.expect-failure' : 'result',
+        'testing.expect-success' : 'result',
+        }
+
+    actions = {
+        'compile' : 'compile',
+        'link' : 'link',
+        'archive' : 'link',
+        }
+
+    fallback_re = re.compile(r'[^.]+[.](compile|link|archive)')
+
+    def __init__(self, extra = None, default = None):
+        self.rules = dict(ActionClassifier.rules)
+        self.actions = dict(ActionClassifier.actions)
+        self.modules = {}
+        self.names = {}
+        self.default = default
+        self.cache = {}
+        if extra:
+            for mapping in extra:
+                self.add(*mapping.split('=',1))
+
+    def add(self, rule, category):
+        if not category:
+            category = None
+        if rule.endswith('.*'):
+            self.modules[rule[:-2]] = category
+        elif '.' in rule:
+            self.rules[rule] = category
+        else:
+            self.actions[rule] = category
+            self.names[rule] = category
+        self.cache.clear()
+
+    def classify(self, name):
+        '''
+        The category of the named action, or the default if it has none.
+        '''
+        try:
+            return self.cache[name]
+        except KeyError:
+            category = self.cache[name] = self.lookup(name)
+            return category
+
+    def lookup(self, name):
+        (module,percent,rule) = name.partition('%')
+        if not module or not percent:
+            return self.default
+        if rule in self.rules:
+            return self.rules[rule]
+        parts = rule.split('.',2)
+        if len(parts) > 1:
+            module_action = parts[0]+'.'+parts[1]
+            if module_action in self.rules:
+                return self.rules[module_action]
+            if parts[1] in self.actions:
+                return self.actions[parts[1]]
+        if module in self.modules:
+            return self.modules[module]
+        if module in self.names:
+            return self.names[module]
+        fallback = self.fallback_re.match(rule)
+        if fallback:
+            return self.actions[fallback.group(1)]
+        return self.default
+
+def add_action_category_option(parser):
+    '''
+    Add the --action-category option, which can be repeated, to the option
+    parser. The mappings are appended to the action_category list of the
+    values parsed into, which is created as needed.
+    '''
+    parser.add_option( '--action-category',
+        help="classify the actions of a rule, a module, or an action, "
+            "e.g. 'doxygen.*=doc', 'msvc.compile.c++.pch=compile', or 'doxygen=doc', can be repeated",
+        action='callback', callback=_append_action_category,
+        type='string', metavar='RULE=CATEGORY' )
+
+def _append_action_category(option, opt_str, value, parser):
+    categories = getattr(parser.values,option.dest,None)
+    if categories is None:
+        categories = []
+        setattr(parser.values,option.dest,categories)
+    categories.append(value)
+
+_time_re = re.compile(
+    r'(\d{4})-(\d\d)-(\d\d)[ T](\d\d):(\d\d):(\d\d)([.]\d+)?\s*(Z|[+-]\d\d:?\d\d)?$')
+
+def parse_time(text):
+    '''
+    The seconds since the epoch of a log timestamp, or None if it's not
+    one. Handles the timestamps as written by b2, with up to nanosecond
+    fractions and a 'Z', and with an explicit UTC offset.
+    '''
+    m = _time_re.match(text.strip())
+    if not m:
+        return None
+    seconds = calendar.timegm(tuple([ int(x) for x in m.group(1,2,3,4,5,6) ]))
+    if m.group(7):
+        seconds += float(m.group(7))
+    zone = m.group(8)
+    if zone and zone != 'Z':
+        offset = int(zone[1:3])*3600+int(zone[-2:])*60
+        if zone[0] == '+':
+            seconds -= offset
+        else:
+            seconds += offset
+    return seconds
+
+def parse_seconds(text, default = 0.0):
+    '''
+    The seconds of a user or system time of an action.
+    '''
+    try:
+        return float(text)
+    except ValueError:
+        return default
+
+def elide(text, limit):
+    '''
+    Shorten the text to about the limit number of characters, keeping the
+    head and the tail of the text which usually have the most relevant
+    information.
+    '''
+    if len(text) <= limit:
+        return text
+    head = limit/2
+    tail = limit-head
+    marker = "\n...[%d bytes omitted]...\n" % (len(text)-limit)
+    if tail > 0:
+        return text[:head]+marker+text[-tail:]
+    else:
+        return text[:head]+marker
+
+class OutputStore(object):
+    '''
+    Content addressed store of action outputs. Each distinct output of at
+    least the minimum size is written once to the directory, in a file
+    named by its SHA-1 digest. The first time an output is seen it's kept
+    as is, and the repeats of it are replaced by a reference to the digest.
+    '''
+
+    def __init__(self, directory, min_size = 1024):
+        self.directory = directory
+        self.min_size = min_size
+        self.seen = set()
+
+    def store(self, output):
+        '''
+        The text to use for the output, either the output itself the first
+        time it's seen, or a reference to it.
+        '''
+        if len(output) < self.min_size:
+            return output
+        if isinstance(output,unicode):
+            data = output.encode('utf-8')
+        else:
+            data = output
+        digest = hashlib.sha1(data).hexdigest()
+        if digest in self.seen:
+            return self.reference(digest,len(data))
+        self.seen.add(digest)
+        path = self.path(digest)
+        if not os.path.exists(path):
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            blob = open(path+'.tmp','wb')
+            blob.write(data)
+            blob.close()
+            os.rename(path+'.tmp',path)
+        return output
+
+    def path(self, digest):
+        return os.path.join(self.directory,digest[0:2],digest)
+
+    def reference(self, digest, size):
+        return "[%d bytes of output, same as the earlier output %s]" % (size,digest)
+
+class ParseCache(object):
+    '''
+    On-disk cache of what was read from logs, to skip parsing them again.
+    An entry is for the inputs and the fingerprint, of the options that
+    change what's read. It has a header, with the size, modification time,
+    and SHA-1 digest of the inputs, followed by any number of pickled
+    objects. An entry is used when the inputs have the same size and time,
+    or the same size and digest, as when the entry was written.
+    '''
+
+    version = 1
+
+    def __init__(self, directory, fingerprint):
+        self.directory = directory
+        self.fingerprint = fingerprint
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def path(self, inputs):
+        key = hashlib.sha1(repr(([ os.path.abspath(i) for i in inputs ],self.fingerprint)))
+        return os.path.join(self.directory,key.hexdigest()+'.pickle')
+
+    def stats(self, inputs):
+        return [ (os.path.getsize(i),os.path.getmtime(i)) for i in inputs ]
+
+    def digest(self, inputs):
+        digest = hashlib.sha1()
+        for i in inputs:
+            f = open(i,'rb')
+            while True:
+                data = f.read(1024*1024)
+                if not data:
+                    break
+                digest.update(data)
+            f.close()
+        return digest.hexdigest()
+
+    def load(self, inputs):
+        '''
+        Generates the objects of the entry for the inputs. Or None when
+        there's no valid entry.
+        '''
+        path = self.path(inputs)
+        if not os.path.exists(path):
+            return None
+        f = open(path,'rb')
+        try:
+            header = cPickle.load(f)
+        except Exception:
+            header = {}
+        stats = self.stats(inputs)
+        valid = header.get('version') == self.version \
+            and header.get('fingerprint') == self.fingerprint \
+            and [ s[0] for s in header['stats'] ] == [ s[0] for s in stats ] \
+            and (header['stats'] == stats or header['digest'] == self.digest(inputs))
+        if not valid:
+            f.close()
+            return None
+        return self.objects(f)
+
+    def objects(self, f):
+        try:
+            while True:
+                yield cPickle.load(f)
+        except EOFError:
+            pass
+        f.close()
+
+    def create(self, inputs):
+        '''
+        A writer of the entry for the inputs, which only replaces the entry
+        once closed.
+        '''
+        return ParseCacheWriter(self.path(inputs),{
+            'version' : self.version,
+            'fingerprint' : self.fingerprint,
+            'stats' : self.stats(inputs),
+            'digest' : self.digest(inputs) })
+
+class ParseCacheWriter(object):
+
+    def __init__(self, path, header):
+        self.path = path
+        self.out = open(path+'.tmp','wb')
+        self.pickler = cPickle.Pickler(self.out,cPickle.HIGHEST_PROTOCOL)
+        self.dump(header)
+
+    def dump(self, obj):
+        self.pickler.dump(obj)
+        #~ Objects are written one after the other, and not referred to
+        #~ by the later ones.
+        self.pickler.clear_memo()
+
+    def close(self):
+        self.out.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        os.rename(self.path+'.tmp',self.path)
+
+    def abort(self):
+        self.out.close()
+        os.remove(self.path+'.tmp')
+
+class Action(object):
+    '''
+    The fields of a build action element of the log. The properties map
+    each property name to the list of its values, in the order given. For
+    example all the 'define' values, or the 'toolset-gcc:version'.
+    '''
+
+    __slots__ = ('name','path','jam_target','command','output',
+        'status','start','end','user','system','properties')
+
+    def property(self, name, default = None):
+        '''
+        The first value of the named property.
+        '''
+        values = self.properties.get(name)
+        if values:
+            return values[0]
+        return default
+
+    def property_values(self, name):
+        '''
+        All the values of the named property.
+        '''
+        return self.properties.get(name,[])
+
+_action_fields = {
+    'name' : 'name',
+    'path' : 'path',
+    'jam-target' : 'jam_target',
+    'command' : 'command',
+    'output' : 'output',
+    }
+
+def read_action(node):
+    '''
+    Read an <action> element into an Action in a single pass over its
+    children. The node can either be a DOM node or an ElementTree element.
+    '''
+    action = Action()
+    action.name = action.path = action.jam_target = ''
+    action.command = action.output = ''
+    action.status = element_attribute(node,'status')
+    action.start = element_attribute(node,'start')
+    action.end = element_attribute(node,'end')
+    action.user = element_attribute(node,'user')
+    action.system = element_attribute(node,'system')
+    properties = action.properties = {}
+    for (tag,child) in element_children(node):
+        if tag == 'properties':
+            for (property_tag,property) in element_children(child):
+                if property_tag == 'property':
+                    properties.setdefault(element_attribute(property,'name'),[]).append(
+                        element_text(property).strip())
+        elif tag in _action_fields:
+            setattr(action,_action_fields[tag],element_text(child))
+    return action
+
+def read_target(node):
+    '''
+    Read a <targets>/<target> element into a tuple of the name, path, and
+    jam target, and the list of dependencies.
+    '''
+    name = path = jam_target = ''
+    dependencies = []
+    for (tag,child) in element_children(node):
+        if tag == 'name':
+            name = element_text(child).strip()
+        elif tag == 'path':
+            path = element_text(child).strip()
+        elif tag == 'jam-target':
+            jam_target = element_text(child).strip()
+        elif tag == 'dependencies':
+            for (dependency_tag,dependency) in element_children(child):
+                if dependency_tag == 'dependency':
+                    dependencies.append(element_text(dependency).strip())
+    return (name,path,jam_target,dependencies)
+
+def read_fields(node):
+    '''
+    The text of the child elements of the node, as a dictionary keyed by
+    the child tag.
+    '''
+    fields = {}
+    for (tag,child) in element_children(node):
+        if tag not in fields:
+            fields[tag] = element_text(child)
+    return fields
+
+_text_node_types = (xml.dom.Node.TEXT_NODE,xml.dom.Node.CDATA_SECTION_NODE)
+
+def element_children(node):
+    '''
+    The (tag,element) pairs of the child elements of the node.
+    '''
+    if isinstance(node,xml.dom.Node):
+        return [ (c.nodeName,c) for c in node.childNodes
+            if c.nodeType == xml.dom.Node.ELEMENT_NODE ]
+    else:
+        return [ (c.tag,c) for c in node ]
+
+def element_text(node):
+    '''
+    The text content directly in the node.
+    '''
+    if isinstance(node,xml.dom.Node):
+        return ''.join([ c.data for c in node.childNodes
+            if c.nodeType in _text_node_types ])
+    else:
+        return node.text or ''
+
+def element_attribute(node, name):
+    '''
+    The value of the attribute, or the empty string when not present.
+    '''
+    if isinstance(node,xml.dom.Node):
+        return node.getAttribute(name)
+    else:
+        return node.get(name,'')
@@ -5,14 +5,30 @@
 # (See accompanying file LICENSE_1_0.txt or http://www.boost.org/LICENSE_1_0.txt)
 
 import re
+import copy
 import optparse
 import time
 import xml.dom.minidom
 import xml.dom.pulldom
-from xml.sax.saxutils import unescape, escape
+import xml.sax
+from xml.sax.saxutils import unescape, escape, XMLGenerator
+from xml.sax.xmlreader import AttributesImpl
 import os.path
+import sys
+import json
+import heapq
+import operator
+from array import array
+from itertools import izip
 from pprint import pprint
 from __builtin__ import exit
+from bjam_log import HandlerRegistry, TargetGraph, ActionClassifier, StringTable, Profiler
+from bjam_log import FollowReader, ParseCache, ActionScanner, SegmentReader, complement_ranges
+from bjam_log import log_compression, open_log, add_action_category_option
+from result_pack import PackWriter
+from duration_baseline import DurationBaseline
+from bjam_log import elide, parse_time, parse_seconds
+from bjam_log import read_action, read_target, read_fields, element_attribute, element_text
 
 class BuildOutputXMLParsing(object):
     '''
@@ -71,54 +87,392 @@ class BuildOutputXMLParsing(object):
             n = n.nextSibling
         return None
 
+class BuildTest(object):
+    '''
+    A test, as declared by --dump-tests, or a library, along with the build
+    actions for it and its result. The actions are those of all the
+    toolsets the test is built with, and the result is that of the last
+    toolset to complete. The runs give them for each toolset.
+    '''
+    
+    __slots__ = ('name','library','test_name','test_type','test_program','target',
+        'info','actions','result')
+    
+    def __init__(self, name, library, test_name, test_type, test_program, target, info = ''):
+        self.name = name
+        self.library = library
+        self.test_name = test_name
+        self.test_type = test_type
+        self.test_program = test_program
+        self.target = target
+        self.info = info
+        self.actions = []
+        self.result = None
+    
+    def runs(self, actions = None):
+        '''
+        The (toolset, actions, result) of the test for each toolset, in the
+        order they were first seen, from its actions or the given ones. The
+        result is that of the result action of the toolset, or else of its
+        last action.
+        '''
+        runs = []
+        by_toolset = {}
+        for action in self.actions if actions is None else actions:
+            if action.toolset not in by_toolset:
+                by_toolset[action.toolset] = [action.toolset,[],None]
+                runs.append(by_toolset[action.toolset])
+            run = by_toolset[action.toolset]
+            run[1].append(action)
+            if action.category == 'result':
+                run[2] = action.result
+        return [ (toolset,run_actions,result or run_actions[-1].result)
+            for (toolset,run_actions,result) in runs ]
+
+class BuildAction(object):
+    '''
+    The parts of a build action kept for reporting. The path is kept split
+    into the directory, which is shared by the actions of a test, and
+    the file. The type is what the action is reported as, which for the
+    result actions is the type of the test, while the category is what the
+    action was classified as.
+    '''
+    
+    __slots__ = ('type','category','toolset','result','name','directory','file',
+        'command','output','time_start','time_end','time_user','time_system',
+        'always_show_run_output','define')
+    
+    @property
+    def path(self):
+        return self.directory+self.file
+
 class BuildOutputProcessor(BuildOutputXMLParsing):
+    '''
+    Reads the build XML output into the tests and their actions.
+    
+    With bounded output the command and output of the actions of a test are
+    thrown away as soon as the test succeeds, unless the test always shows
+    its output. And the output kept for each test, and in total, is limited
+    to the given number of bytes.
     
-    def __init__(self, inputs):
+    With a profiler the handlers, the helpers they use, and the reading of
+    the XML, are timed.
+    
+    When following, the inputs are read as they are written by a running
+    build, until they are closed or didn't grow for the follow timeout.
+    And the test listener, if any, is called with each test as its result
+    action is read. The action listener, if any, is called with every
+    action read, including those of no test.
+    
+    With target times, the whole target dependency DAG is kept, along with
+    the total wall time of the actions of each target. And the times of
+    the first start and last end of all the actions.
+    
+    The tests can be selected by library, test name, and toolset, and only
+    the failed ones kept. Then the log is read without its actions first,
+    for the tests and targets. And only the actions of the selected tests
+    are parsed, as found from the jam target and toolset properties in the
+    raw text of each action. Without outputs the command and output of the
+    actions are cut out before parsing.
+    
+    With a cache directory, what's read from the inputs is saved there, and
+    loaded instead of parsing the same inputs again with the same options.
+    The completion of the tests is kept too, to replay it to the test
+    listener. The cache isn't used when following, or with an action
+    listener, as those need the parsing to happen.
+    '''
+    
+    def __init__(self, inputs, dispatch_stats = False, action_categories = None,
+        bounded_output = False, test_output_limit = None, total_output_limit = None,
+        profiler = None, follow = False, follow_timeout = 600.0, test_listener = None,
+        target_times = False, libraries = None, test_names = None, toolsets = None,
+        failed_only = False, outputs = True, cache_dir = None):
+        self.registry = HandlerRegistry(self,stats=dispatch_stats)
+        self.follow = follow
+        self.follow_timeout = follow_timeout
+        self.test_listener = test_listener
+        self.action_listener = None
+        self.profiler = profiler
+        if self.profiler:
+            self.instrument(self.profiler)
+        self.bounded_output = bounded_output
+        self.test_output_limit = test_output_limit
+        self.total_output_limit = total_output_limit
+        self.output_size = 0
+        # Actions we don't know about still get included in the test
+        # results, as 'other' actions.
+        self.classifier = ActionClassifier(action_categories,default='other')
         self.test = {}
         self.target_to_test = {}
-        self.target = {}
-        self.parent = {}
+        self.targets = TargetGraph(dependencies=target_times)
+        self.target_times = None
+        if target_times:
+            self.target_times = {}
+            self.time_span = [None,None]
         self.timestamps = []
-        for input in inputs:
-            self.add_input(input)
+        self.strings = StringTable()
+        self.libraries = set(libraries or [])
+        self.test_names = set(test_names or [])
+        self.toolsets = set(toolsets or [])
+        self.failed_only = failed_only
+        self.outputs = outputs
+        self.toolset_re = None
+        if self.toolsets:
+            self.toolset_re = self.toolset_regex(self.toolsets)
+        self.cache_dir = cache_dir
+        self.test_events = None
+        if inputs:
+            self.add_inputs(inputs)
+    
+    #~ What's read from the inputs, and kept in the cache.
+    model_fields = ('test','target_to_test','targets','timestamps',
+        'target_times','time_span','output_size','test_events')
+    
+    def add_inputs(self, inputs):
+        '''
+        Add all the build XML output files, from the cache if they were read
+        before.
+        '''
+        cache = None
+        if self.cache_dir and not self.follow and not self.action_listener:
+            cache = ParseCache(self.cache_dir,self.cache_fingerprint())
+            cached = cache.load(inputs)
+            if cached is not None:
+                for (field,value) in cached.next().iteritems():
+                    setattr(self,field,value)
+                if self.test_listener:
+                    self.replay_test_events()
+                return
+            cache_entry = cache.create(inputs)
+            self.test_events = []
+        try:
+            for input in inputs:
+                self.add_input(input)
+            if self.failed_only:
+                self.drop_succeeded()
+        except:
+            if cache:
+                cache_entry.abort()
+            raise
+        if cache:
+            cache_entry.dump(dict([ (field,getattr(self,field,None)) for field in self.model_fields ]))
+            cache_entry.close()
+    
+    def replay_test_events(self):
+        '''
+        Call the test listener for each test completed, with the test as it
+        was then.
+        '''
+        for (name,count,result) in self.test_events:
+            test = copy.copy(self.test[name])
+            test.actions = test.actions[:count]
+            test.result = result
+            self.test_listener(test)
+    
+    def cache_fingerprint(self):
+        '''
+        The options that change what's read from the inputs.
+        '''
+        return ('build_log',2,sorted(self.classifier.rules.items()),
+            sorted(self.classifier.actions.items()),sorted(self.classifier.modules.items()),
+            sorted(self.classifier.names.items()),
+            self.bounded_output,self.test_output_limit,self.total_output_limit,
+            self.target_times is not None,
+            sorted(self.libraries),sorted(self.test_names),sorted(self.toolsets),
+            self.failed_only,self.outputs)
     
     def add_input(self, input):
         '''
-        Add a single build XML output file to our data.
+        Add a single build XML output file to our data. The file can be
+        compressed with gzip, bzip2, or xz.
         '''
+        if self.follow:
+            source = FollowReader(input,idle_timeout=self.follow_timeout)
+            try:
+                self.parse_input(source)
+            except xml.sax.SAXParseException:
+                # The build stopped writing the log before closing it, what
+                # was read up to then is kept.
+                if source.complete:
+                    raise
+            source.close()
+        elif log_compression(input):
+            # A compressed log is parsed as it's decompressed. It can't be
+            # mapped in memory for the selective parsing, but the handlers
+            # still only keep the selected tests.
+            source = open_log(input)
+            self.parse_input(source)
+            source.close()
+        elif self.selective():
+            self.parse_selected(input)
+        else:
+            self.parse_input(input)
+    
+    def selective(self):
+        return bool(self.libraries or self.test_names or self.toolsets or not self.outputs)
+    
+    def parse_selected(self, input):
+        '''
+        Parse the log without its actions, and then only the selected
+        actions.
+        '''
+        import mmap
+        f = open(input,'rb')
+        if os.fstat(f.fileno()).st_size == 0:
+            f.close()
+            self.parse_input(input)
+            return
+        data = mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+        (begins,ends) = ActionScanner(data).ranges()
+        self.parse_input(SegmentReader(data,complement_ranges(begins,ends,len(data))))
+        self.parse_input(SegmentReader(data,self.selected_segments(data,begins,ends)))
+        data.close()
+        f.close()
+    
+    jam_target_re = re.compile(r'<jam-target>\s*(?:<!\[CDATA\[(.*?)\]\]>|([^<]*))\s*</jam-target>',re.S)
+    version_re = re.compile(r'''name=["']toolset-[^"':]+:version["']''')
+    
+    def selected_segments(self, data, begins, ends):
+        '''
+        The segments of the selected actions, in a build element.
+        '''
+        yield '<build>'
+        for i in xrange(len(begins)):
+            (begin,end) = (begins[i],ends[i])
+            if not self.select_action(data,begin,end):
+                continue
+            if self.outputs:
+                yield (begin,end)
+                continue
+            command = data.find('<command',begin,end)
+            output = data.rfind('</output>',begin,end)
+            if command < 0 or output < command:
+                yield (begin,end)
+            else:
+                yield (begin,command)
+                yield (output+len('</output>'),end)
+        yield '</build>'
+    
+    def select_action(self, data, begin, end):
+        '''
+        Whether the action in the data range is of a selected test, or
+        can't be told from its raw text.
+        '''
+        if self.libraries or self.test_names:
+            jam_target = self.jam_target_re.search(data,begin,end)
+            if jam_target:
+                if jam_target.group(1) is not None:
+                    jam_target = jam_target.group(1)
+                else:
+                    jam_target = unescape(jam_target.group(2))
+                try:
+                    root = self.targets.root_name(jam_target.strip().decode('utf-8'))
+                except KeyError:
+                    root = None
+                if root is not None and root not in self.target_to_test:
+                    return False
+        if self.toolset_re and self.version_re.search(data,begin,end):
+            if not self.toolset_re.search(data,begin,end):
+                return False
+        return True
+    
+    def toolset_regex(self, toolsets):
+        '''
+        A regex matching the version property of any of the toolsets, as
+        in "gcc-5" being '<property name="toolset-gcc:version">5'.
+        '''
+        choices = []
+        for toolset in toolsets:
+            parts = toolset.split('-')
+            for i in xrange(1,len(parts)):
+                choices.append(r'''name=["']toolset-%s:version["']\s*>\s*(?:<!\[CDATA\[)?\s*%s\s*(?:\]\]>)?\s*<''' % (
+                    re.escape('-'.join(parts[:i])),re.escape('-'.join(parts[i:]))))
+        return re.compile('|'.join(choices))
+    
+    def select_test(self, test):
+        '''
+        Whether the test is of the selected libraries and names.
+        '''
+        if self.libraries and test.library not in self.libraries:
+            return False
+        if self.test_names and test.test_name not in self.test_names \
+            and test.name not in self.test_names:
+            return False
+        return True
+    
+    def drop_succeeded(self):
+        '''
+        Forget the toolsets a test succeeded with, and the tests that
+        succeeded with all of them, when only the failed ones are kept.
+        '''
+        for name in self.test.keys():
+            test = self.test[name]
+            if not test.actions:
+                continue
+            failed = set([ toolset for (toolset,actions,result) in test.runs()
+                if result != 'succeed' ])
+            if not failed:
+                del self.test[name]
+            elif len(failed) < len(set([ action.toolset for action in test.actions ])):
+                test.actions = [ action for action in test.actions if action.toolset in failed ]
+                test.result = 'fail'
+    
+    def parse_input(self, input):
         events = xml.dom.pulldom.parse(input)
+        parse_events = events
+        if self.profiler:
+            events.expandNode = self.profiler.wrap('expandNode',events.expandNode)
+            parse_events = self.profiler.iterate('pulldom',events)
         context = []
-        for (event,node) in events:
+        for (event,node) in parse_events:
             if event == xml.dom.pulldom.START_ELEMENT:
-                context.append(node)
+                context.append(node.nodeName)
                 if node.nodeType == xml.dom.Node.ELEMENT_NODE:
-                    x_f = self.x_name_(*context)
+                    x_f = self.registry.resolve(tuple(context))
                     if x_f:
                         events.expandNode(node)
                         # expanding eats the end element, hence walking us out one level
                         context.pop()
                         # call handler
-                        (x_f[1])(node)
+                        x_f(node)
             elif event == xml.dom.pulldom.END_ELEMENT:
                 context.pop()
     
-    def x_name_(self, *context, **kwargs):
-        node = None
-        names = [ ]
-        for c in context:
-            if c:
-                if not isinstance(c,xml.dom.Node):
-                    suffix = '_'+c.replace('-','_').replace('#','_')
-                else:
-                    suffix = '_'+c.nodeName.replace('-','_').replace('#','_')
-                    node = c
-                names.append('x')
-                names = map(lambda x: x+suffix,names)
-        if node:
-            for name in names:
-                if hasattr(self,name):
-                    return (name,getattr(self,name))
-        return None
+    def write_pack(self, path):
+        '''
+        Write the tests, and their actions, to a result pack file. A test
+        has a record for each toolset, as process_jam_log.py has a test log.
+        '''
+        pack = PackWriter(path)
+        for name in sorted(self.test.keys()):
+            test = self.test[name]
+            for (toolset,actions,result) in test.runs():
+                pack.add_test(test.library,test.test_name,test.test_type,toolset,
+                    actions[0].directory,result,[ {
+                        'type' : action.type,
+                        'result' : action.result,
+                        'name' : action.name,
+                        'path' : action.path,
+                        'start' : action.time_start,
+                        'end' : action.time_end,
+                        'user' : action.time_user,
+                        'system' : action.time_system,
+                        'command' : action.command,
+                        'output' : action.output } for action in actions ])
+        pack.close()
+    
+    def instrument(self, profiler):
+        '''
+        Profile the handlers and helpers. The bytes of action output handled
+        are added up too.
+        '''
+        profiler.instrument_handlers(self)
+        profiler.instrument(self,[
+            'add_input','get_test','get_action_output','set_action_info',
+            'get_toolset','bound_output','release_output'],
+            sizes={ 'get_action_output' : len })
+        profiler.instrument(sys.modules[__name__],[
+            'read_action','read_target','read_fields'])
     
     def x_build_test(self, node):
         '''
@@ -126,21 +480,23 @@ class BuildOutputProcessor(BuildOutputXMLParsing):
         get expanded as we process the rest of the results.
         '''
         test_node = node
-        test_name = test_node.getAttribute('name')
-        test_target = self.get_child_data(test_node,tag='target',strip=True)
+        test_name = element_attribute(test_node,'name')
+        test_fields = read_fields(test_node)
+        test_target = test_fields.get('target','').strip()
         ## print ">>> %s %s" %(test_name,test_target)
-        self.test[test_name] = {
-            'library' : "/".join(test_name.split('/')[0:-1]),
-            'test-name' : test_name.split('/')[-1],
-            'test-type' : test_node.getAttribute('type').lower(),
-            'test-program' : self.get_child_data(test_node,tag='source',strip=True),
-            'target' : test_target,
-            'info' : self.get_child_data(test_node,tag='info',strip=True),
-            'dependencies' : [],
-            'actions' : [],
-            }
+        test = BuildTest(
+            name = test_name,
+            library = self.strings("/".join(test_name.split('/')[0:-1])),
+            test_name = test_name.split('/')[-1],
+            test_type = self.strings(element_attribute(test_node,'type').lower()),
+            test_program = test_fields.get('source','').strip(),
+            target = test_target,
+            info = self.strings(test_fields.get('info','').strip()))
+        if not self.select_test(test):
+            return None
+        self.test[test_name] = test
         # Add a lookup for the test given the test target.
-        self.target_to_test[self.test[test_name]['target']] = test_name
+        self.target_to_test[test.target] = test_name
         return None
     
     def x_build_targets_target( self, node ):
@@ -148,22 +504,9 @@ class BuildOutputProcessor(BuildOutputXMLParsing):
         Process the target dependency DAG into an ancestry tree so we can look up
         which top-level library and test targets specific build actions correspond to.
         '''
-        target_node = node
-        name = self.get_child_data(target_node,tag='name',strip=True)
-        path = self.get_child_data(target_node,tag='path',strip=True)
-        jam_target = self.get_child_data(target_node,tag='jam-target',strip=True)
-        #~ Map for jam targets to virtual targets.
-        self.target[jam_target] = {
-            'name' : name,
-            'path' : path
-            }
-        #~ Create the ancestry.
-        dep_node = self.get_child(self.get_child(target_node,tag='dependencies'),tag='dependency')
-        while dep_node:
-            child = self.get_data(dep_node,strip=True)
-            child_jam_target = '<p%s>%s' % (path,child.split('//',1)[1])
-            self.parent[child_jam_target] = jam_target
-            dep_node = self.get_sibling(dep_node.nextSibling,tag='dependency')
+        (name,path,jam_target,dependencies) = read_target(node)
+        #~ Map for jam targets to virtual targets, and create the ancestry.
+        self.targets.add_target(jam_target,name,path,dependencies)
         return None
     
     def x_build_action( self, node ):
@@ -171,104 +514,162 @@ class BuildOutputProcessor(BuildOutputXMLParsing):
         Given a build action log, process into the corresponding test log and
         specific test log sub-part.
         '''
-        action_node = node
-        name = self.get_child(action_node,tag='name')
+        build_action = read_action(node)
+        if self.target_times is not None:
+            self.add_target_time(build_action)
+        if self.action_listener:
+            self.action_listener(build_action)
+        name = build_action.name
         if name:
-            name = self.get_data(name)
             #~ Based on the action, we decide what sub-section the log
             #~ should go into.
-            action_type = None
-            if re.match('[^%]+%[^.]+[.](compile)',name):
-                action_type = 'compile'
-            elif re.match('[^%]+%[^.]+[.](link|archive)',name):
-                action_type = 'link'
-            elif re.match('[^%]+%testing[.](capture-output)',name):
-                action_type = 'run'
-            elif re.match('[^%]+%testing[.](expect-failure|expect-success)',name):
-                action_type = 'result'
-            else:
-                # TODO: Enable to see what other actions can be included in the test results.
-                # action_type = None
-                action_type = 'other'
+            action_type = self.classifier.classify(name)
             #~ print "+   [%s] %s %s :: %s" %(action_type,name,'','')
             if action_type:
                 #~ Get the corresponding test.
-                (target,test) = self.get_test(action_node,type=action_type)
+                (target,test) = self.get_test(build_action,type=action_type)
                 #~ Skip action that have no corresponding test as they are
                 #~ regular build actions and don't need to show up in the
                 #~ regression results.
                 if not test:
                     ##print "??? [%s] %s %s :: %s" %(action_type,name,target,test)
                     return None
+                toolset = self.get_toolset(build_action)
+                if self.toolsets and toolset not in self.toolsets:
+                    return None
                 ##print "+++ [%s] %s %s :: %s" %(action_type,name,target,test)
                 #~ Collect some basic info about the action.
-                action = {
-                    'command' : self.get_action_command(action_node,action_type),
-                    'output' : self.get_action_output(action_node,action_type),
-                    'info' : self.get_action_info(action_node,action_type)
-                    }
+                action = BuildAction()
+                if self.outputs:
+                    action.command = self.get_action_command(build_action,action_type)
+                    action.output = self.get_action_output(build_action,action_type)
+                else:
+                    action.command = action.output = ''
+                self.set_action_info(action,build_action,action_type)
                 #~ For the test result status we find the appropriate node
                 #~ based on the type of test. Then adjust the result status
                 #~ accordingly. This makes the result status reflect the
                 #~ expectation as the result pages post processing does not
                 #~ account for this inversion.
-                action['type'] = action_type
+                action.type = action.category = action_type
+                action.toolset = toolset
                 if action_type == 'result':
-                    if re.match(r'^compile',test['test-type']):
-                        action['type'] = 'compile'
-                    elif re.match(r'^link',test['test-type']):
-                        action['type'] = 'link'
-                    elif re.match(r'^run',test['test-type']):
-                        action['type'] = 'run'
+                    if re.match(r'^compile',test.test_type):
+                        action.type = 'compile'
+                    elif re.match(r'^link',test.test_type):
+                        action.type = 'link'
+                    elif re.match(r'^run',test.test_type):
+                        action.type = 'run'
                 #~ The result sub-part we will add this result to.
-                if action_node.getAttribute('status') == '0':
-                    action['result'] = 'succeed'
+                if build_action.status == '0':
+                    action.result = 'succeed'
                 else:
-                    action['result'] = 'fail'
+                    action.result = 'fail'
                 # Add the action to the test.
-                test['actions'].append(action)
+                if self.bounded_output:
+                    self.bound_output(test,action)
+                test.actions.append(action)
                 # Set the test result if this is the result action for the test.
                 if action_type == 'result':
-                    test['result'] = action['result']
+                    test.result = action.result
+                    if self.failed_only and test.result == 'succeed':
+                        self.release_output(test,toolset)
+                        return None
+                    if self.test_events is not None:
+                        self.test_events.append((test.name,len(test.actions),test.result))
+                    if self.test_listener:
+                        self.test_listener(test)
+                    if self.bounded_output and test.result == 'succeed' \
+                        and not self.always_show_output(test):
+                        self.release_output(test,toolset)
         return None
     
+    def add_target_time( self, build_action ):
+        '''
+        Add the wall time of the action to its target.
+        '''
+        start = parse_time(build_action.start)
+        end = parse_time(build_action.end)
+        if start is None or end is None:
+            return
+        i = self.targets.id(build_action.jam_target)
+        self.target_times[i] = self.target_times.get(i,0.0)+max(end-start,0.0)
+        if self.time_span[0] is None or start < self.time_span[0]:
+            self.time_span[0] = start
+        if self.time_span[1] is None or end > self.time_span[1]:
+            self.time_span[1] = end
+    
+    def bound_output( self, test, action ):
+        '''
+        Shorten the output of an action to fit in what's left of the output
+        limits of the test, and in total.
+        '''
+        size = len(action.command)+len(action.output)
+        budget = size
+        if self.test_output_limit is not None:
+            test_size = 0
+            for test_action in test.actions:
+                test_size += len(test_action.command)+len(test_action.output)
+            budget = min(budget,self.test_output_limit-test_size)
+        if self.total_output_limit is not None:
+            budget = min(budget,self.total_output_limit-self.output_size)
+        if budget < size:
+            action.output = elide(action.output,max(budget-len(action.command),0))
+        self.output_size += len(action.command)+len(action.output)
+    
+    def release_output( self, test, toolset = None ):
+        '''
+        Throw away the command and output of the actions of the test, or
+        only of those of the toolset.
+        '''
+        for action in test.actions:
+            if toolset is not None and action.toolset != toolset:
+                continue
+            self.output_size -= len(action.command)+len(action.output)
+            action.command = ''
+            action.output = ''
+    
+    def always_show_output( self, test ):
+        if test.info == 'always_show_run_output':
+            return True
+        for action in test.actions:
+            if action.always_show_run_output:
+                return True
+        return False
+    
     def x_build_timestamp( self, node ):
         '''
         The time-stamp goes to the corresponding attribute in the result.
         '''
-        self.timestamps.append(self.get_data(node).strip())
+        self.timestamps.append(element_text(node).strip())
         return None
     
-    def get_test( self, node, type = None ):
+    def get_test( self, action, type = None ):
         '''
         Find the test corresponding to an action. For testing targets these
         are the ones pre-declared in the --dump-test option. For libraries
         we create a dummy test as needed.
         '''
-        jam_target = self.get_child_data(node,tag='jam-target')
-        base = self.target[jam_target]['name']
-        target = jam_target
-        while target in self.parent:
-            target = self.parent[target]
+        jam_target = action.jam_target
+        base = self.targets.name(jam_target)
         #~ print "--- TEST: %s ==> %s" %(jam_target,target)
         #~ main-target-type is a precise indicator of what the build target is
         #~ originally meant to be.
-        #main_type = self.get_child_data(self.get_child(node,tag='properties'),
-        #    name='main-target-type',strip=True)
+        #main_type = action.property('main-target-type')
         main_type = None
         if main_type == 'LIB' and type:
-            lib = self.target[target]['name']
+            lib = self.targets.root_name(jam_target)
             if not lib in self.test:
-                self.test[lib] = {
-                    'library' : re.search(r'libs/([^/]+)',lib).group(1),
-                    'test-name' : os.path.basename(lib),
-                    'test-type' : 'lib',
-                    'test-program' : os.path.basename(lib),
-                    'target' : lib
-                    }
+                self.test[lib] = BuildTest(
+                    name = lib,
+                    library = self.strings(re.search(r'libs/([^/]+)',lib).group(1)),
+                    test_name = os.path.basename(lib),
+                    test_type = 'lib',
+                    test_program = os.path.basename(lib),
+                    target = lib)
             test = self.test[lib]
         else:
-            target_name_ = self.target[target]['name']
+            target_name_ = self.targets.root_name(jam_target)
             if self.target_to_test.has_key(target_name_):
                 test = self.test[self.target_to_test[target_name_]]
             else:
@@ -277,38 +678,43 @@ class BuildOutputProcessor(BuildOutputXMLParsing):
     
     #~ The command executed for the action. For run actions we omit the command
     #~ as it's just noise.
-    def get_action_command( self, action_node, action_type ):
+    def get_action_command( self, action, action_type ):
         if action_type != 'run':
-            return self.get_child_data(action_node,tag='command')
+            return action.command
         else:
             return ''
     
     #~ The command output.
-    def get_action_output( self, action_node, action_type ):
-        return self.get_child_data(action_node,tag='output',default='')
+    def get_action_output( self, action, action_type ):
+        return action.output
     
     #~ Some basic info about the action.
-    def get_action_info( self, action_node, action_type ):
-        info = {}
+    def set_action_info( self, action, build_action, action_type ):
         #~ The jam action and target.
-        info['name'] = self.get_child_data(action_node,tag='name')
-        info['path'] = self.get_child_data(action_node,tag='path')
+        action.name = self.strings(build_action.name)
+        path = build_action.path
+        file_start = max(path.rfind('/'),path.rfind('\\'))+1
+        action.directory = self.strings(path[:file_start])
+        action.file = path[file_start:]
         #~ The timing of the action.
-        info['time-start'] = action_node.getAttribute('start')
-        info['time-end'] = action_node.getAttribute('end')
-        info['time-user'] = action_node.getAttribute('user')
-        info['time-system'] = action_node.getAttribute('system')
+        action.time_start = build_action.start
+        action.time_end = build_action.end
+        action.time_user = build_action.user
+        action.time_system = build_action.system
         #~ Testing properties.
-        test_info_prop = self.get_child_data(self.get_child(action_node,tag='properties'),name='test-info')
-        info['always_show_run_output'] = test_info_prop == 'always_show_run_output'
+        test_info_prop = build_action.property('test-info')
+        action.always_show_run_output = test_info_prop == 'always_show_run_output'
         #~ And for compiles some context that may be hidden if using response files.
         if action_type == 'compile':
-            info['define'] = []
-            define = self.get_child(self.get_child(action_node,tag='properties'),name='define')
-            while define:
-                info['define'].append(self.get_data(define,strip=True))
-                define = self.get_sibling(define.nextSibling,name='define')
-        return info
+            action.define = tuple(build_action.property_values('define'))
+        else:
+            action.define = None
+    
+    #~ The precise toolset from the build properties.
+    def get_toolset( self, build_action ):
+        toolset = build_action.property('toolset')
+        toolset_version = build_action.property('toolset-%s:version'%toolset)
+        return self.strings('%s-%s' %(toolset,toolset_version))
 
 class BuildConsoleSummaryReport(object):
     
@@ -319,16 +725,16 @@ class BuildConsoleSummaryReport(object):
     FAIL = '\033[31m'
     ENDC = '\033[0m'
     
+    streaming = False
+    
     def __init__(self, bop, opt):
         self.bop = bop
+        self.started = False
+        # The number of actions printed so far for each test.
+        self.printed = {}
     
     def generate(self):
-        self.summary_info = {
-            'total' : 0,
-            'success' : 0,
-            'failed' : [],
-            }
-        self.header_print("======================================================================")
+        self.start()
         self.print_test_log()
         self.print_summary()
         self.header_print("======================================================================")
@@ -337,47 +743,89 @@ class BuildConsoleSummaryReport(object):
     def failed(self):
         return len(self.summary_info['failed']) > 0
     
-    def print_test_log(self):
+    def start(self):
+        '''
+        Print the header of the test log, once. When following a log the
+        tests are printed as they complete, after this.
+        '''
+        if self.started:
+            return
+        self.started = True
+        self.header_print("======================================================================")
         self.header_print("Tests run..")
         self.header_print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
+    
+    def test_complete(self, test):
+        '''
+        Print a test as soon as its result is known, when following a log.
+        '''
+        self.print_test(test)
+        sys.stdout.flush()
+    
+    def print_test_log(self):
         for k in sorted(self.bop.test.keys()):
             test = self.bop.test[k]
-            if len(test['actions']) > 0:
-                self.summary_info['total'] += 1
-                ##print ">>>> {0}".format(test['test-name'])
-                if 'result' in test:
-                    succeed = test['result'] == 'succeed'
-                else:
-                    succeed = test['actions'][-1]['result'] == 'succeed'
-                if succeed:
-                    self.summary_info['success'] += 1
-                else:
-                    self.summary_info['failed'].append(test)
-                if succeed:
-                    self.ok_print("[PASS] {0}",k)
-                else:
-                    self.fail_print("[FAIL] {0}",k)
-                for action in test['actions']:
-                    self.print_action(succeed, action)
+            if len(test.actions) > self.printed.get(k,0):
+                self.print_test(test)
+    
+    def print_test(self, test):
+        '''
+        Print the test result, and the actions of it not printed yet.
+        '''
+        succeed = self.test_succeed(test)
+        if succeed:
+            self.ok_print("[PASS] {0}",test.name)
+        else:
+            self.fail_print("[FAIL] {0}",test.name)
+        for action in test.actions[self.printed.get(test.name,0):]:
+            self.print_action(succeed, action)
+        self.printed[test.name] = len(test.actions)
+    
+    def test_succeed(self, test):
+        if test.result is not None:
+            return test.result == 'succeed'
+        else:
+            return test.actions[-1].result == 'succeed'
     
     def print_action(self, test_succeed, action):
         '''
         Print the detailed info of failed or always print tests.
         '''
         #self.info_print(">>> {0}",action.keys())
-        if not test_succeed or action['info']['always_show_run_output']:
-            output = action['output'].strip()
+        if not test_succeed or action.always_show_run_output:
+            output = action.output.strip()
             if output != "":
-                p = self.fail_print if action['result'] == 'fail' else self.p_print
+                p = self.fail_print if action.result == 'fail' else self.p_print
                 self.info_print("")
-                self.info_print("({0}) {1}",action['info']['name'],action['info']['path'])
+                self.info_print("({0}) {1}",action.name,action.path)
                 p("")
-                p("{0}",action['command'].strip())
+                p("{0}",action.command.strip())
                 p("")
                 for line in output.splitlines():
                     p("{0}",line.encode('utf-8'))
     
+    def summarize(self):
+        '''
+        The number of tests, and of those that succeeded, and the names of
+        those that failed.
+        '''
+        self.summary_info = {
+            'total' : 0,
+            'success' : 0,
+            'failed' : [],
+            }
+        for k in sorted(self.bop.test.keys()):
+            test = self.bop.test[k]
+            if len(test.actions) > 0:
+                self.summary_info['total'] += 1
+                if self.test_succeed(test):
+                    self.summary_info['success'] += 1
+                else:
+                    self.summary_info['failed'].append(
+                        u"{0}/{1}".format(test.library,test.test_name))
+    
     def print_summary(self):
+        self.summarize()
         self.header_print("")
         self.header_print("Testing summary..")
         self.header_print("~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~")
@@ -385,8 +833,8 @@ class BuildConsoleSummaryReport(object):
         self.p_print("Success: {0}",self.summary_info['success'])
         if self.failed:
             self.fail_print("Failed: {0}",len(self.summary_info['failed']))
-            for test in self.summary_info['failed']:
-                self.fail_print("  {0}/{1}",test['library'],test['test-name'])
+            for name in self.summary_info['failed']:
+                self.fail_print("  {0}",name)
     
     def p_print(self, format, *args, **kargs):
         print format.format(*args,**kargs)
@@ -406,21 +854,775 @@ class BuildConsoleSummaryReport(object):
     def fail_print(self, format, *args, **kargs):
         print self.FAIL+format.format(*args,**kargs)+self.ENDC
 
+class BuildSummaryReport(BuildConsoleSummaryReport):
+    '''
+    Only the number of tests, passed and failed, by library and toolset.
+    A test is counted for each toolset it's built with. As the outputs
+    aren't shown they are not read at all.
+    '''
+    
+    def generate(self):
+        self.start()
+        self.print_counts()
+        self.print_summary()
+        self.header_print("======================================================================")
+    
+    def print_counts(self):
+        counts = {}
+        for test in self.bop.test.itervalues():
+            for (toolset,actions,result) in test.runs():
+                count = counts.setdefault((test.library,toolset),[0,0])
+                count[0 if result == 'succeed' else 1] += 1
+        self.p_print("{0:>8} {1:>8}  {2}",'passed','failed','library, toolset')
+        for (library,toolset) in sorted(counts.keys()):
+            (passed,failed) = counts[(library,toolset)]
+            p = self.fail_print if failed else self.p_print
+            p("{0:>8} {1:>8}  {2}, {3}",passed,failed,library,toolset)
+    
+    def summarize(self):
+        self.summary_info = {
+            'total' : 0,
+            'success' : 0,
+            'failed' : [],
+            }
+        for k in sorted(self.bop.test.keys()):
+            test = self.bop.test[k]
+            for (toolset,actions,result) in test.runs():
+                self.summary_info['total'] += 1
+                if result == 'succeed':
+                    self.summary_info['success'] += 1
+                else:
+                    self.summary_info['failed'].append(
+                        u"{0}/{1}, {2}".format(test.library,test.test_name,toolset))
+
+class BuildStreamReport(object):
+    '''
+    Base of the reports that are written one test at a time, as each test
+    completes, instead of from all the tests at the end. A test is written
+    for each toolset it's built with, as the result action of the toolset
+    is read, with the actions of that toolset. Tests that never complete
+    are written at the end.
+    '''
+    
+    streaming = True
+    
+    def __init__(self, bop, opt, out = None):
+        self.bop = bop
+        self.out = out or sys.stdout
+        self.started = False
+        self.failures = 0
+        # The number of actions written so far for each test and toolset.
+        self.written = {}
+    
+    @property
+    def failed(self):
+        return self.failures > 0
+    
+    def start(self):
+        if self.started:
+            return
+        self.started = True
+        self.write_start()
+    
+    def test_complete(self, test):
+        # The test is complete for the toolset of the result action just
+        # added to it.
+        self.write(test,test.actions[-1].toolset)
+        self.out.flush()
+    
+    def generate(self):
+        self.start()
+        for k in sorted(self.bop.test.keys()):
+            self.write(self.bop.test[k])
+        self.write_end()
+        self.out.flush()
+    
+    def write(self, test, toolset = None):
+        '''
+        Write the actions of the test not written yet, for each toolset or
+        only the given one.
+        '''
+        for (run_toolset,actions,result) in test.runs():
+            if toolset is not None and run_toolset != toolset:
+                continue
+            key = (test.name,run_toolset)
+            written = self.written.get(key,0)
+            if len(actions) <= written:
+                continue
+            self.written[key] = len(actions)
+            succeed = result == 'succeed'
+            if not succeed:
+                self.failures += 1
+            self.write_test(test,run_toolset,actions[written:],succeed)
+    
+    def action_timing(self, action):
+        '''
+        The start and end times of the action, in seconds since the epoch,
+        and the duration, user, and system times in seconds.
+        '''
+        start = parse_time(action.time_start)
+        end = parse_time(action.time_end)
+        duration = None
+        if start is not None and end is not None:
+            duration = end-start
+        return {
+            'start' : start,
+            'end' : end,
+            'duration' : duration,
+            'user' : parse_seconds(action.time_user),
+            'system' : parse_seconds(action.time_system)
+            }
+    
+    def test_timing(self, timings):
+        '''
+        The combined timing of the actions of a test. From the start of
+        the first action to the end of the last one, and the total of the
+        user and system times.
+        '''
+        starts = [ t['start'] for t in timings if t['start'] is not None ]
+        ends = [ t['end'] for t in timings if t['end'] is not None ]
+        timing = {
+            'start' : None,
+            'end' : None,
+            'duration' : None,
+            'user' : sum([ t['user'] for t in timings ]),
+            'system' : sum([ t['system'] for t in timings ])
+            }
+        if starts and ends:
+            timing['start'] = min(starts)
+            timing['end'] = max(ends)
+            timing['duration'] = timing['end']-timing['start']
+        return timing
+    
+    def show_output(self, succeed, action):
+        return not succeed or action.always_show_run_output
+    
+    def write_start(self):
+        pass
+    
+    def write_end(self):
+        pass
+
+class BuildJSONLinesReport(BuildStreamReport):
+    '''
+    A JSON object per line for each test. With the test identification,
+    result, and timing, and the same for each action. The command and
+    output are included for the actions of failed tests, and for those
+    that always show their output.
+    '''
+    
+    def write_test(self, test, toolset, actions, succeed):
+        records = []
+        for action in actions:
+            record = {
+                'type' : action.type,
+                'result' : action.result,
+                'name' : action.name,
+                'path' : action.path,
+                }
+            record.update(self.action_timing(action))
+            if self.show_output(succeed,action):
+                record['command'] = action.command
+                record['output'] = action.output
+            records.append(record)
+        record = {
+            'library' : test.library,
+            'test' : test.test_name,
+            'type' : test.test_type,
+            'toolset' : toolset,
+            'result' : 'succeed' if succeed else 'fail',
+            'actions' : records
+            }
+        record.update(self.test_timing(records))
+        self.out.write(json.dumps(record,sort_keys=True,separators=(',',':')))
+        self.out.write('\n')
+
+class BuildJUnitReport(BuildStreamReport):
+    '''
+    JUnit XML, with a testcase for each test in a single testsuite. The
+    testcase class name is the toolset and library, and failed tests have
+    the command and output of their actions as the failure text. As the
+    report is streamed the testsuite doesn't have the counts of tests.
+    '''
+    
+    invalid_xml_re = re.compile(u'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+    
+    def write_start(self):
+        self.writer = XMLGenerator(self.out,'utf-8')
+        self.writer.startDocument()
+        self.writer.startElement('testsuites',AttributesImpl({}))
+        self.writer.characters('\n')
+        self.writer.startElement('testsuite',AttributesImpl({'name' : 'boost'}))
+        self.writer.characters('\n')
+    
+    def write_end(self):
+        self.writer.endElement('testsuite')
+        self.writer.characters('\n')
+        self.writer.endElement('testsuites')
+        self.writer.characters('\n')
+        self.writer.endDocument()
+    
+    def write_test(self, test, toolset, actions, succeed):
+        timing = self.test_timing([ self.action_timing(action) for action in actions ])
+        classname = test.library.replace('/','.')
+        if toolset:
+            classname = toolset+'.'+classname
+        attributes = {
+            'classname' : classname,
+            'name' : test.test_name
+            }
+        if timing['duration'] is not None:
+            attributes['time'] = '%.3f' % timing['duration']
+        self.writer.startElement('testcase',AttributesImpl(attributes))
+        text = self.actions_text(succeed,actions)
+        if not succeed:
+            failed = [ action for action in actions if action.result == 'fail' ]
+            if failed:
+                message = '%s failed' % failed[0].type
+            else:
+                message = '%s failed' % actions[-1].type
+            self.writer.startElement('failure',AttributesImpl({'message' : message}))
+            self.writer.characters(text)
+            self.writer.endElement('failure')
+        elif text:
+            self.writer.startElement('system-out',AttributesImpl({}))
+            self.writer.characters(text)
+            self.writer.endElement('system-out')
+        self.writer.endElement('testcase')
+        self.writer.characters('\n')
+    
+    def actions_text(self, succeed, actions):
+        text = []
+        for action in actions:
+            if self.show_output(succeed,action):
+                output = action.output.strip()
+                if output:
+                    text.append(u"(%s) %s\n\n%s\n\n%s\n" % (
+                        action.name,action.path,action.command.strip(),output))
+        return self.invalid_xml_re.sub(u'?',u'\n'.join(text))
+
+_library_re = re.compile(r'[/\\]libs[/\\]([^/\\]+)')
+
+def action_library(path):
+    '''
+    The library of an action, from the libs/<library> in its path, or
+    'other'.
+    '''
+    library = _library_re.search(path)
+    if library:
+        return library.group(1)
+    return 'other'
+
+class BuildActionTimings(object):
+    '''
+    The timings of all the actions of the build, as columns of numbers. The
+    start and end times in seconds since the epoch, the user and system
+    times, and their derived wall and CPU times. Along with the library,
+    toolset, and action type of each action as indices into the lists of
+    their names. Times that are missing are NaN.
+    
+    The actions are added as they are read, including those of no test,
+    as the library builds. The library is that of the path of the action,
+    and the type is the category the action was classified as. The result
+    actions are left out, as they only check the outcome of the others.
+    '''
+    
+    def __init__(self, bop):
+        self.bop = bop
+        self.names = []
+        self.start = array('d')
+        self.end = array('d')
+        self.user = array('d')
+        self.system = array('d')
+        self.library = array('l')
+        self.toolset = array('l')
+        self.type = array('l')
+        self.libraries = []
+        self.toolsets = []
+        self.types = []
+        self.labels = {}
+        self.wall = None
+        self.cpu = None
+    
+    def add_action(self, build_action):
+        bop = self.bop
+        category = bop.classifier.classify(build_action.name)
+        if category is None or category == 'result':
+            return
+        (target,test) = bop.get_test(build_action)
+        library = action_library(build_action.path)
+        if test is None and (bop.test_names or bop.libraries and library not in bop.libraries):
+            return
+        toolset = 'other'
+        if build_action.property('toolset'):
+            toolset = bop.get_toolset(build_action)
+        if bop.toolsets and toolset not in bop.toolsets:
+            return
+        path = build_action.path
+        self.names.append((test.name if test else library,
+            path[max(path.rfind('/'),path.rfind('\\'))+1:]))
+        nan = float('nan')
+        start = parse_time(build_action.start)
+        end = parse_time(build_action.end)
+        self.start.append(nan if start is None else start)
+        self.end.append(nan if end is None else end)
+        self.user.append(parse_seconds(build_action.user,nan))
+        self.system.append(parse_seconds(build_action.system,nan))
+        self.library.append(self.label(self.libraries,library))
+        self.toolset.append(self.label(self.toolsets,toolset))
+        self.type.append(self.label(self.types,category))
+    
+    def complete(self):
+        '''
+        Derive the wall and CPU times, once all the actions are added.
+        '''
+        self.wall = array('d',map(operator.sub,self.end,self.start))
+        self.cpu = array('d',map(operator.add,self.user,self.system))
+    
+    def label(self, names, name):
+        key = (id(names),name)
+        if key not in self.labels:
+            self.labels[key] = len(names)
+            names.append(name)
+        return self.labels[key]
+    
+    def __len__(self):
+        return len(self.names)
+
+def group_totals(keys, values, count):
+    '''
+    The total of the values, and the number of them, for each of the count
+    keys. Skipping NaN values.
+    '''
+    totals = [0.0]*count
+    counts = [0]*count
+    for (key,value) in izip(keys,values):
+        if value == value:
+            totals[key] += value
+            counts[key] += 1
+    return (totals,counts)
+
+def percentiles(values, points):
+    '''
+    The nearest rank percentiles of the values, skipping NaN values. Or
+    None when there are no values.
+    '''
+    values = sorted([ v for v in values if v == v ])
+    if not values:
+        return None
+    return [ values[min(int(len(values)*p/100.0),len(values)-1)] for p in points ]
+
+class BuildAnalyticsReport(object):
+    '''
+    Where the build time goes. The slowest compile, link, and run actions,
+    the wall and CPU time by library, toolset, and action type, and the
+    distribution of the wall time of the actions of each type.
+    '''
+    
+    streaming = False
+    failed = False
+    points = (50,90,99,100)
+    
+    def __init__(self, bop, opt):
+        self.bop = bop
+        self.top = getattr(opt,'top',None) or 20
+        self.timings = BuildActionTimings(bop)
+        bop.action_listener = self.timings.add_action
+    
+    def generate(self):
+        timings = self.timings
+        timings.complete()
+        self.print_slowest(timings)
+        self.print_totals(timings,'library',timings.library,timings.libraries)
+        self.print_totals(timings,'toolset',timings.toolset,timings.toolsets)
+        self.print_totals(timings,'action type',timings.type,timings.types)
+        self.print_percentiles(timings)
+    
+    def print_slowest(self, timings):
+        wall = timings.wall
+        for action_type in ('compile','link','run'):
+            if action_type not in timings.types:
+                continue
+            t = timings.types.index(action_type)
+            slowest = heapq.nlargest(self.top,
+                [ i for i in xrange(len(timings)) if timings.type[i] == t and wall[i] == wall[i] ],
+                key=wall.__getitem__)
+            print "Slowest %s actions:" % action_type
+            print "%10s %10s  %s" % ('wall (s)','cpu (s)','test or library, toolset: target')
+            for i in slowest:
+                (name,target) = timings.names[i]
+                print ("%10.2f %10.2f  %s, %s: %s" % (wall[i],timings.cpu[i],
+                    name,timings.toolsets[timings.toolset[i]],target)).encode('utf-8')
+            print
+    
+    def print_totals(self, timings, name, keys, labels):
+        (wall,counts) = group_totals(keys,timings.wall,len(labels))
+        (cpu,_) = group_totals(keys,timings.cpu,len(labels))
+        print "Time by %s:" % name
+        print "%10s %12s %12s %8s  %s" % ('actions','wall (s)','cpu (s)','cpu %',name)
+        total = sum(cpu) or 1.0
+        for i in sorted(xrange(len(labels)),key=lambda i: (-cpu[i],labels[i])):
+            print ("%10d %12.2f %12.2f %8.1f  %s" % (
+                counts[i],wall[i],cpu[i],cpu[i]*100.0/total,labels[i])).encode('utf-8')
+        print
+    
+    def print_percentiles(self, timings):
+        print "Wall time percentiles (s) by action type:"
+        print "%10s %10s %10s %10s %10s  %s" % (('actions',)+tuple([ 'p%d' % p for p in self.points ])+('type',))
+        for t in xrange(len(timings.types)):
+            values = [ w for (k,w) in izip(timings.type,timings.wall) if k == t ]
+            p = percentiles(values,self.points)
+            if p:
+                print ("%10d %10.2f %10.2f %10.2f %10.2f  %s" % (
+                    (len(values),)+tuple(p)+(timings.types[t],))).encode('utf-8')
+        print
+
+class BuildCriticalPathReport(object):
+    '''
+    The chain of targets that bounds the wall time of the build, from the
+    wall time of the actions of each target and the target dependency DAG.
+    With the total work W and the critical path length L the wall time
+    with N jobs is at least max(W/N,L), and greedy scheduling gets it
+    within W/N+L. Which gives the speedup possible with more jobs.
+    '''
+    
+    streaming = False
+    failed = False
+    
+    def __init__(self, bop, opt):
+        self.bop = bop
+        self.jobs = getattr(opt,'build_jobs',None) or 1
+    
+    def generate(self):
+        bop = self.bop
+        targets = bop.targets
+        (span,path) = targets.longest_path(bop.target_times)
+        work = sum(bop.target_times.values())
+        print "Critical path, %.2fs over %d targets:" % (span,len(path))
+        print "%10s %10s  %s" % ('start (s)','time (s)','target')
+        jam_targets = dict([ (i,jam_target) for (jam_target,i) in targets.ids.iteritems() ])
+        start = 0.0
+        for i in reversed(path):
+            time = bop.target_times.get(i,0.0)
+            name = targets.names[i] or jam_targets[i]
+            print ("%10.2f %10.2f  %s" % (start,time,name)).encode('utf-8')
+            start += time
+        print
+        print "Total work: %.2fs in %d targets" % (work,len(bop.target_times))
+        if span > 0:
+            print "Parallelism (work/critical path): %.2f" % (work/span)
+        if bop.time_span[0] is not None:
+            print "Observed wall time: %.2fs" % (bop.time_span[1]-bop.time_span[0])
+        print
+        print "%6s %14s %14s %10s" % ('jobs','at least (s)','at most (s)','speedup')
+        jobs = sorted(set([ 2**n for n in range(0,9) ]+[self.jobs]))
+        for n in jobs:
+            lower = max(work/n,span)
+            upper = work/n+span
+            speedup = 0.0
+            if lower > 0:
+                speedup = work/lower
+            if n == self.jobs:
+                mark = '  <- -j%d' % n
+            else:
+                mark = ''
+            print "%6d %14.2f %14.2f %10.2f%s" % (n,lower,upper,speedup,mark)
+        print
+
+class BuildTraceReport(object):
+    '''
+    The timeline of all the actions as Chrome trace event JSON, for viewing
+    in chrome://tracing or Perfetto. The actions are put in lanes that
+    reconstruct the job slots of the build, each action going to the lowest
+    lane that's free at its start. Actions are colored by their type, or
+    by their library, and failures stand out. The trace format only has a
+    fixed palette of color names, so libraries share the colors when there
+    are more of them. The category is the type and the library, to select
+    by either.
+    '''
+    
+    streaming = False
+    failed = False
+    colors = {
+        'compile' : 'thread_state_running',
+        'link' : 'rail_load',
+        'run' : 'rail_response',
+        'result' : 'rail_idle',
+        'other' : 'generic_work',
+        'fail' : 'terrible',
+        }
+    library_colors = ('thread_state_running','rail_load','rail_response',
+        'rail_idle','rail_animation','thread_state_iowait','thread_state_runnable',
+        'generic_work','good','olive','yellow','startup','cq_build_running',
+        'cq_build_passed','background_memory_dump','light_memory_dump')
+    
+    def __init__(self, bop, opt):
+        self.bop = bop
+        self.color_by = getattr(opt,'trace_color',None) or 'type'
+        self.start = array('d')
+        self.end = array('d')
+        self.actions = []
+        bop.action_listener = self.add_action
+    
+    def add_action(self, build_action):
+        start = parse_time(build_action.start)
+        end = parse_time(build_action.end)
+        if start is None or end is None:
+            return
+        self.start.append(start)
+        self.end.append(max(end,start))
+        self.actions.append((build_action.name,build_action.path,build_action.status))
+    
+    def lanes(self):
+        '''
+        The lane of each action, assigned greedily in order of start time.
+        '''
+        lanes = array('l',[0])*len(self.actions)
+        busy = []
+        free = []
+        count = 0
+        for i in sorted(xrange(len(self.actions)),key=self.start.__getitem__):
+            while busy and busy[0][0] <= self.start[i]:
+                heapq.heappush(free,heapq.heappop(busy)[1])
+            if free:
+                lane = heapq.heappop(free)
+            else:
+                lane = count
+                count += 1
+            lanes[i] = lane
+            heapq.heappush(busy,(self.end[i],lane))
+        return (lanes,count)
+    
+    def generate(self):
+        out = sys.stdout
+        out.write('{"displayTimeUnit":"ms","traceEvents":[\n')
+        separator = ''
+        for event in self.events():
+            out.write(separator)
+            out.write(json.dumps(event,sort_keys=True,separators=(',',':')))
+            separator = ',\n'
+        out.write('\n]}\n')
+    
+    def events(self):
+        '''
+        The trace events, the process and lane names, then the actions.
+        '''
+        (lanes,count) = self.lanes()
+        origin = min(self.start) if self.start else 0.0
+        libraries = sorted(set([ action_library(path) for (name,path,status) in self.actions ]))
+        library_colors = dict([ (library,self.library_colors[i % len(self.library_colors)])
+            for (i,library) in enumerate(libraries) ])
+        yield { 'ph' : 'M', 'name' : 'process_name', 'pid' : 1,
+            'args' : { 'name' : 'b2' } }
+        for lane in xrange(count):
+            yield { 'ph' : 'M', 'name' : 'thread_name', 'pid' : 1, 'tid' : lane,
+                'args' : { 'name' : 'job %d' % (lane+1) } }
+        for i in xrange(len(self.actions)):
+            (name,path,status) = self.actions[i]
+            action_type = self.bop.classifier.classify(name) or 'other'
+            library = action_library(path)
+            if status != '0':
+                color = self.colors['fail']
+            elif self.color_by == 'library':
+                color = library_colors[library]
+            else:
+                color = self.colors.get(action_type,self.colors['other'])
+            file_start = max(path.rfind('/'),path.rfind('\\'))+1
+            yield {
+                'ph' : 'X',
+                'pid' : 1,
+                'tid' : lanes[i],
+                'name' : path[file_start:] or name,
+                'cat' : '%s,%s' % (action_type,library),
+                'ts' : int((self.start[i]-origin)*1000000),
+                'dur' : int((self.end[i]-self.start[i])*1000000),
+                'cname' : color,
+                'args' : { 'action' : name, 'path' : path, 'status' : status }
+                }
+
+class BuildRegressionReport(object):
+    '''
+    The compile, link, and run actions of all the targets, and the total of
+    each library, that are significantly slower than in the earlier runs
+    of the baseline. The durations are the wall times of the actions, and
+    optionally are added to the baseline as the latest run. Regressions
+    fail the report.
+    '''
+    
+    streaming = False
+    failed = False
+    types = ('compile','link','run')
+    
+    def __init__(self, bop, opt):
+        self.bop = bop
+        self.opt = opt
+        self.baseline = DurationBaseline(opt.baseline,runs=opt.baseline_runs)
+        self.durations = {}
+        bop.action_listener = self.add_action
+    
+    def add_action(self, build_action):
+        action_type = self.bop.classifier.classify(build_action.name)
+        if action_type not in self.types:
+            return
+        start = parse_time(build_action.start)
+        end = parse_time(build_action.end)
+        if start is None or end is None:
+            return
+        for key in (('target',action_type,build_action.path),
+            ('library',action_type,action_library(build_action.path))):
+            self.durations[key] = self.durations.get(key,0.0)+max(end-start,0.0)
+    
+    def generate(self):
+        opt = self.opt
+        regressions = self.baseline.compare(self.durations,
+            threshold=opt.regression_threshold,
+            min_runs=opt.regression_min_runs)
+        print "Compared %d durations to the %d runs of the baseline." % (
+            len(self.durations),self.baseline.runs)
+        for kind in ('library','target'):
+            found = [ r for r in regressions if r[0][0] == kind ]
+            if not found:
+                continue
+            self.failed = True
+            print
+            print "Slower %s actions:" % kind
+            print "%10s %10s %10s %8s %8s  %s" % ('now (s)','median (s)','MAD (s)','ratio','score',kind)
+            for ((_,action_type,name),duration,m,mad,score) in found:
+                print ("%10.2f %10.2f %10.2f %8.2f %8.1f  %s %s" % (
+                    duration,m,mad,duration/max(m,0.001),score,action_type,name)).encode('utf-8')
+        if not regressions:
+            print "No regressions."
+        if opt.update_baseline:
+            self.baseline.add_run(self.durations)
+            self.baseline.save()
+
 class Main(object):
     
     def __init__(self,args=None):
         op = optparse.OptionParser(
             usage="%prog [options] input+")
         op.add_option( '--output',
-            help="type of output to generate" )
+            help="type of output to generate, 'console', 'summary', 'jsonl', 'junit', 'analytics', 'critical-path', 'trace', or 'regressions'" )
+        op.add_option( '--library',
+            help="only the tests of the library, can be repeated",
+            action='append' )
+        op.add_option( '--test',
+            help="only the tests of the name, as 'test' or 'library/test', can be repeated",
+            action='append' )
+        op.add_option( '--toolset',
+            help="only the tests with the toolset, as in 'gcc-5', can be repeated",
+            action='append' )
+        op.add_option( '--failed-only',
+            help="only the tests that failed",
+            action='store_true' )
+        op.add_option( '--cache-dir',
+            help="keep what's read from the inputs in the directory, and load it from there when reading the same inputs again",
+            metavar='DIR' )
+        op.add_option( '--top',
+            help="with analytics output, the number of slowest actions shown (default 20)",
+            type='int', default=20 )
+        op.add_option( '--build-jobs',
+            help="with critical-path output, the -j the build was run with (default 1)",
+            type='int', default=1 )
+        op.add_option( '--trace-color',
+            help="with trace output, color the actions by 'type' (default) or 'library'",
+            type='choice', choices=['type','library'], default='type' )
+        op.add_option( '--baseline',
+            help="with regressions output, the file of the action durations of the earlier runs",
+            metavar='FILE' )
+        op.add_option( '--baseline-runs',
+            help="the number of runs kept in the baseline (default that of the file, or 10)",
+            type='int' )
+        op.add_option( '--update-baseline',
+            help="with regressions output, add the durations of the inputs to the baseline as the latest run",
+            action='store_true' )
+        op.add_option( '--regression-threshold',
+            help="with regressions output, the robust standard deviations over the median that make a regression (default 3.5)",
+            type='float', default=3.5 )
+        op.add_option( '--regression-min-runs',
+            help="with regressions output, the earlier runs needed to compare an action (default 3)",
+            type='int', default=3 )
+        op.add_option( '--dispatch-stats',
+            help="print the number of elements seen for each element path",
+            action='store_true' )
+        add_action_category_option(op)
+        op.add_option( '--bounded-output',
+            help="throw away the output of tests as soon as they succeed, and limit the output kept",
+            action='store_true' )
+        op.add_option( '--test-output-limit',
+            help="with bounded output, the bytes of output kept per test (default 1MiB)",
+            type='int', default=1024*1024 )
+        op.add_option( '--total-output-limit',
+            help="with bounded output, the bytes of output kept in total (default 256MiB)",
+            type='int', default=256*1024*1024 )
+        op.add_option( '--profile',
+            help="time the element handlers and helpers, and write the profile as JSON to the file",
+            metavar='FILE' )
+        op.add_option( '--pack',
+            help="write the tests and their actions to the file, as a binary result pack",
+            metavar='FILE' )
+        op.add_option( '--follow',
+            help="process the inputs while they are being written, reporting each test as soon as it's complete",
+            action='store_true' )
+        op.add_option( '--follow-timeout',
+            help="with --follow, the seconds without an input growing after which it's taken as ended (default 600)",
+            type='float', default=600.0 )
         ( opt, inputs ) = op.parse_args(args)
-        bop = BuildOutputProcessor(inputs)
+        self.failed = False
+        profiler = None
+        if opt.profile:
+            profiler = Profiler()
+        bop = BuildOutputProcessor([],dispatch_stats=opt.dispatch_stats,
+            action_categories=opt.action_category,
+            bounded_output=opt.bounded_output,
+            test_output_limit=opt.test_output_limit,
+            total_output_limit=opt.total_output_limit,
+            profiler=profiler,
+            follow=opt.follow,
+            follow_timeout=opt.follow_timeout,
+            target_times=opt.output == 'critical-path',
+            libraries=opt.library,
+            test_names=opt.test,
+            toolsets=opt.toolset,
+            failed_only=opt.failed_only,
+            outputs=opt.output != 'summary',
+            cache_dir=opt.cache_dir)
         output = None
         if opt.output == 'console':
             output = BuildConsoleSummaryReport(bop, opt)
+        elif opt.output == 'summary':
+            output = BuildSummaryReport(bop, opt)
+        elif opt.output == 'jsonl':
+            output = BuildJSONLinesReport(bop, opt)
+        elif opt.output == 'junit':
+            output = BuildJUnitReport(bop, opt)
+        elif opt.output == 'analytics':
+            output = BuildAnalyticsReport(bop, opt)
+        elif opt.output == 'critical-path':
+            output = BuildCriticalPathReport(bop, opt)
+        elif opt.output == 'trace':
+            output = BuildTraceReport(bop, opt)
+        elif opt.output == 'regressions':
+            if not opt.baseline:
+                op.error("regressions output needs a --baseline")
+            output = BuildRegressionReport(bop, opt)
+        if output and profiler:
+            profiler.instrument(output,['generate','print_action','write_test'])
+        # Only the console and the stream reports can show the tests as
+        # they complete, the other reports are generated at the end.
+        if output and (output.streaming or opt.follow and hasattr(output,'test_complete')):
+            output.start()
+            bop.test_listener = output.test_complete
+        bop.add_inputs(inputs)
+        bop.registry.print_stats()
+        if opt.pack:
+            bop.write_pack(opt.pack)
         if output:
             output.generate()
             self.failed = output.failed
+        if profiler:
+            profiler.report()
+            profiler.save(opt.profile)
 
 if __name__ == '__main__':
     m = Main()
@@ -146,6 +146,83 @@ class xmlrpcProxyTransport(xmlrpclib.Transport):
         connection.putheader('Host',self.realhost)
     
 
+def add_dart_test_log( dart_dom, log_xml, runner_id, tag, platform, timestamp, run_type ):
+    #~ Add the results of a test log, given as its XML text, to the Dart
+    #~ submission for its toolset. The submissions are kept by toolset in
+    #~ the dart_dom dictionary, and created as needed.
+    log_xml = log_xml.translate(ascii_only_table)
+    #~ utils.log( '--- XML:\n%s' % log_xml)
+    #~ It seems possible to get an empty XML result file :-(
+    if log_xml == "": return
+    log_dom = xml.dom.minidom.parseString(log_xml)
+    test = {
+        'library': log_dom.documentElement.getAttribute('library'),
+        'test-name': log_dom.documentElement.getAttribute('test-name'),
+        'toolset': log_dom.documentElement.getAttribute('toolset')
+        }
+    if not test['test-name'] or test['test-name'] == '':
+        test['test-name'] = 'unknown'
+    if not test['toolset'] or test['toolset'] == '':
+        test['toolset'] = 'unknown'
+    if not dart_dom.has_key(test['toolset']):
+        dart_dom[test['toolset']] = xml.dom.minidom.parseString(
+'''<?xml version="1.0" encoding="UTF-8"?>
+<DartSubmission version="2.0" createdby="collect_and_upload_logs.py">
+    <Site>%(site)s</Site>
+    <BuildName>%(buildname)s</BuildName>
+    <Track>%(track)s</Track>
+    <DateTimeStamp>%(datetimestamp)s</DateTimeStamp>
+</DartSubmission>
+'''         % {
+                'site': runner_id,
+                'buildname': "%s -- %s (%s)" % (platform,test['toolset'],run_type),
+                'track': dart_track[run_type],
+                'datetimestamp' : timestamp
+            } )
+    submission_dom = dart_dom[test['toolset']]
+    for node in log_dom.documentElement.childNodes:
+        if node.nodeType == xml.dom.Node.ELEMENT_NODE:
+            if node.firstChild:
+                log_data = xml.sax.saxutils.escape(node.firstChild.data)
+            else:
+                log_data = ''
+            test_dom = xml.dom.minidom.parseString('''<?xml version="1.0" encoding="UTF-8"?>
+<Test>
+    <Name>.Test.Boost.%(tag)s.%(library)s.%(test-name)s.%(type)s</Name>
+    <Status>%(result)s</Status>
+    <Measurement name="Toolset" type="text/string">%(toolset)s</Measurement>
+    <Measurement name="Timestamp" type="text/string">%(timestamp)s</Measurement>
+    <Measurement name="Log" type="text/text">%(log)s</Measurement>
+</Test>
+    '''         % {
+                    'tag': tag,
+                    'library': test['library'],
+                    'test-name': test['test-name'],
+                    'toolset': test['toolset'],
+                    'type': node.nodeName,
+                    'result': dart_status_from_result[node.getAttribute('result')],
+                    'timestamp': node.getAttribute('timestamp'),
+                    'log': log_data
+                })
+            submission_dom.documentElement.appendChild(
+                test_dom.documentElement.cloneNode(1) )
+
+
+def submit_dart( dart_dom, dart_server, tag, http_proxy = None ):
+    try:
+        rpc_transport = None
+        if http_proxy:
+            rpc_transport = xmlrpcProxyTransport(http_proxy)
+        dart_rpc = xmlrpclib.ServerProxy(
+            'http://%s/%s/Command/' % (dart_server,dart_project[tag]),
+            rpc_transport )
+        for dom in dart_dom.values():
+            #~ utils.log('Dart XML: %s' % dom.toxml('utf-8'))
+            dart_rpc.Submit.put(xmlrpclib.Binary(dom.toxml('utf-8')))
+    except Exception, e:
+        utils.log('Dart server error: %s' % e)
+
+
 def publish_test_logs(
     input_dirs,
     runner_id, tag, platform, comment_file, timestamp, user, source, run_type,
@@ -155,7 +232,6 @@ def publish_test_logs(
     ):
     __log__ = 1
     utils.log( 'Publishing test logs ...' )
-    dart_rpc = None
     dart_dom = {}
     
     def _publish_test_log_files_ ( unused, dir, names ):
@@ -163,79 +239,14 @@ def publish_test_logs(
             if os.path.basename( file ) == 'test_log.xml':
                 utils.log( 'Publishing test log "%s"' % os.path.join(dir,file) )
                 if dart_server:
-                    log_xml = open(os.path.join(dir,file)).read().translate(ascii_only_table)
-                    #~ utils.log( '--- XML:\n%s' % log_xml)
-                    #~ It seems possible to get an empty XML result file :-(
-                    if log_xml == "": continue
-                    log_dom = xml.dom.minidom.parseString(log_xml)
-                    test = {
-                        'library': log_dom.documentElement.getAttribute('library'),
-                        'test-name': log_dom.documentElement.getAttribute('test-name'),
-                        'toolset': log_dom.documentElement.getAttribute('toolset')
-                        }
-                    if not test['test-name'] or test['test-name'] == '':
-                        test['test-name'] = 'unknown'
-                    if not test['toolset'] or test['toolset'] == '':
-                        test['toolset'] = 'unknown'
-                    if not dart_dom.has_key(test['toolset']):
-                        dart_dom[test['toolset']] = xml.dom.minidom.parseString(
-'''<?xml version="1.0" encoding="UTF-8"?>
-<DartSubmission version="2.0" createdby="collect_and_upload_logs.py">
-    <Site>%(site)s</Site>
-    <BuildName>%(buildname)s</BuildName>
-    <Track>%(track)s</Track>
-    <DateTimeStamp>%(datetimestamp)s</DateTimeStamp>
-</DartSubmission>
-'''                         % {
-                                'site': runner_id,
-                                'buildname': "%s -- %s (%s)" % (platform,test['toolset'],run_type),
-                                'track': dart_track[run_type],
-                                'datetimestamp' : timestamp
-                            } )
-                    submission_dom = dart_dom[test['toolset']]
-                    for node in log_dom.documentElement.childNodes:
-                        if node.nodeType == xml.dom.Node.ELEMENT_NODE:
-                            if node.firstChild:
-                                log_data = xml.sax.saxutils.escape(node.firstChild.data)
-                            else:
-                                log_data = ''
-                            test_dom = xml.dom.minidom.parseString('''<?xml version="1.0" encoding="UTF-8"?>
-<Test>
-    <Name>.Test.Boost.%(tag)s.%(library)s.%(test-name)s.%(type)s</Name>
-    <Status>%(result)s</Status>
-    <Measurement name="Toolset" type="text/string">%(toolset)s</Measurement>
-    <Measurement name="Timestamp" type="text/string">%(timestamp)s</Measurement>
-    <Measurement name="Log" type="text/text">%(log)s</Measurement>
-</Test>
-    '''                         % {
-                                    'tag': tag,
-                                    'library': test['library'],
-                                    'test-name': test['test-name'],
-                                    'toolset': test['toolset'],
-                                    'type': node.nodeName,
-                                    'result': dart_status_from_result[node.getAttribute('result')],
-                                    'timestamp': node.getAttribute('timestamp'),
-                                    'log': log_data
-                                })
-                            submission_dom.documentElement.appendChild(
-                                test_dom.documentElement.cloneNode(1) )
+                    add_dart_test_log( dart_dom, open(os.path.join(dir,file)).read(),
+                        runner_id, tag, platform, timestamp, run_type )
     
     for input_dir in input_dirs:
         utils.log( 'Walking directory "%s" ...' % input_dir )
         os.path.walk( input_dir, _publish_test_log_files_, None )
     if dart_server:
-        try:
-            rpc_transport = None
-            if http_proxy:
-                rpc_transport = xmlrpcProxyTransport(http_proxy)
-            dart_rpc = xmlrpclib.ServerProxy(
-                'http://%s/%s/Command/' % (dart_server,dart_project[tag]),
-                rpc_transport )
-            for dom in dart_dom.values():
-                #~ utils.log('Dart XML: %s' % dom.toxml('utf-8'))
-                dart_rpc.Submit.put(xmlrpclib.Binary(dom.toxml('utf-8')))
-        except Exception, e:
-            utils.log('Dart server error: %s' % e)
+        submit_dart( dart_dom, dart_server, tag, http_proxy )
 
 
 def upload_to_ftp( tag, results_file, ftp_proxy, debug_level, ftp_url ):
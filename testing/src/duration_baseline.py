@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+
+# Distributed under the Boost Software License, Version 1.0.
+# (See accompanying file LICENSE_1_0.txt or copy at
+# http://www.boost.org/LICENSE_1_0.txt)
+
+'''
+Store of the action durations of the last runs, to tell when a change
+makes the compile, link, or run of a target, or the whole of a library,
+significantly slower. The file has:
+
+* A header, with the magic, version, the number of runs kept, and the
+  number of keys.
+* The keys, as UTF-8 text, one per line. Each key is the kind, 'target'
+  or 'library', the action type, and the name, separated by tabs.
+* The durations, in seconds, as doubles. A row for each key, with a
+  column for each run kept, the oldest first. Durations missing from a
+  run are NaN.
+
+A duration is a regression when it's over the median of the earlier ones
+by more than a number of robust standard deviations, estimated from the
+median absolute deviation. The median and MAD aren't thrown off by the
+odd slow run, as the mean and standard deviation would be.
+'''
+
+import optparse
+import os
+import struct
+import sys
+from array import array
+
+_magic = 'BDBL'
+_version = 1
+_header = struct.Struct('<4sIII')
+
+#~ The MAD times this is an estimate of the standard deviation, for
+#~ normally distributed durations.
+_mad_scale = 1.4826
+
+def median(values):
+    values = sorted(values)
+    n = len(values)
+    if n % 2:
+        return values[n/2]
+    return (values[n/2-1]+values[n/2])/2.0
+
+def robust_stats(values):
+    '''
+    The median and the median absolute deviation of the values.
+    '''
+    m = median(values)
+    return (m,median([ abs(v-m) for v in values ]))
+
+class DurationBaseline(object):
+    '''
+    The durations of the last runs, by key. The keys are tuples of the
+    kind, action type, and name. The number of runs kept is that of the
+    file loaded, unless given.
+    '''
+
+    default_runs = 10
+
+    def __init__(self, path = None, runs = None):
+        self.path = path
+        self.runs = runs
+        self.keys = []
+        self.index = {}
+        self.durations = array('d')
+        if path and os.path.exists(path):
+            self.load(path)
+        if not self.runs:
+            self.runs = self.default_runs
+
+    def load(self, path):
+        f = open(path,'rb')
+        (magic,version,runs,count) = _header.unpack(f.read(_header.size))
+        if magic != _magic or version != _version:
+            raise ValueError("'%s' is not a version %d duration baseline" % (path,_version))
+        keys = []
+        for i in xrange(count):
+            keys.append(tuple(f.readline().rstrip('\n').decode('utf-8').split('\t',2)))
+        durations = array('d')
+        durations.fromfile(f,count*runs)
+        if sys.byteorder != 'little':
+            durations.byteswap()
+        f.close()
+        if not self.runs:
+            self.runs = runs
+        self.keys = []
+        self.index = {}
+        self.durations = array('d')
+        for (i,key) in enumerate(keys):
+            row = self.add_key(key)
+            self.durations[row:row+self.runs] = self.resize(durations[i*runs:(i+1)*runs])
+
+    def save(self, path = None):
+        path = path or self.path
+        f = open(path+'.tmp','wb')
+        f.write(_header.pack(_magic,_version,self.runs,len(self.keys)))
+        for key in self.keys:
+            f.write(u'\t'.join(key).encode('utf-8')+'\n')
+        durations = array('d',self.durations)
+        if sys.byteorder != 'little':
+            durations.byteswap()
+        durations.tofile(f)
+        f.close()
+        if os.path.exists(path):
+            os.remove(path)
+        os.rename(path+'.tmp',path)
+
+    def resize(self, row):
+        '''
+        The row as the last runs, padding the oldest with NaN.
+        '''
+        if len(row) >= self.runs:
+            return row[len(row)-self.runs:]
+        return array('d',[float('nan')])*(self.runs-len(row))+row
+
+    def add_key(self, key):
+        '''
+        The offset of the durations of the key, adding it if new.
+        '''
+        if key not in self.index:
+            self.index[key] = len(self.keys)
+            self.keys.append(key)
+            self.durations.extend(array('d',[float('nan')])*self.runs)
+        return self.index[key]*self.runs
+
+    def history(self, key):
+        '''
+        The durations of the key in the runs kept, skipping missing ones.
+        '''
+        if key not in self.index:
+            return []
+        i = self.index[key]*self.runs
+        return [ d for d in self.durations[i:i+self.runs] if d == d ]
+
+    def add_run(self, durations):
+        '''
+        Add the durations, by key, of a run as the latest, dropping the
+        oldest run.
+        '''
+        for key in durations.keys():
+            self.add_key(key)
+        runs = self.runs
+        for (i,key) in enumerate(self.keys):
+            row = self.durations[i*runs+1:(i+1)*runs]
+            row.append(durations.get(key,float('nan')))
+            self.durations[i*runs:(i+1)*runs] = row
+
+    def compare(self, durations, threshold = 3.5, min_runs = 3,
+        min_ratio = 1.1, min_seconds = 0.5):
+        '''
+        The regressions of the durations, by key, as (key, duration,
+        median, MAD, score) tuples, the worst first. The score is the excess
+        over the median in robust standard deviations, which has to be over
+        the threshold. The duration also has to be over the median by the
+        ratio and the seconds, so that tiny and steady durations don't get
+        flagged for noise. Keys with fewer than min_runs earlier durations
+        are skipped.
+        '''
+        regressions = []
+        for (key,duration) in durations.iteritems():
+            history = self.history(key)
+            if len(history) < min_runs:
+                continue
+            (m,mad) = robust_stats(history)
+            excess = duration-m
+            if excess < min_seconds or duration < m*min_ratio:
+                continue
+            #~ A MAD of zero is common for a handful of identical runs, so
+            #~ the deviation is floored at a small part of the median.
+            deviation = max(mad*_mad_scale,m*0.01,0.001)
+            score = excess/deviation
+            if score > threshold:
+                regressions.append((key,duration,m,mad,score))
+        regressions.sort(key=lambda r: (-r[4],r[0]))
+        return regressions
+
+def main(args = None):
+    opt = optparse.OptionParser(
+        usage="%prog [options] baseline [kind [type]]")
+    opt.add_option( '--name',
+        help="only the keys whose name contains the text" )
+    ( options, args ) = opt.parse_args(args)
+    if not args:
+        opt.error("no baseline given")
+    baseline = DurationBaseline(args[0])
+    print "%d keys, %d runs kept" % (len(baseline.keys),baseline.runs)
+    print "%6s %10s %10s  %s" % ('runs','median (s)','MAD (s)','key')
+    for key in sorted(baseline.keys):
+        if len(args) > 1 and key[0] != args[1]:
+            continue
+        if len(args) > 2 and key[1] != args[2]:
+            continue
+        if options.name and options.name not in key[2]:
+            continue
+        history = baseline.history(key)
+        if history:
+            (m,mad) = robust_stats(history)
+            print (u"%6d %10.2f %10.2f  %s" % (len(history),m,mad,u' '.join(key))).encode('utf-8')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+
+# Distributed under the Boost Software License, Version 1.0.
+# (See accompanying file LICENSE_1_0.txt or copy at
+# http://www.boost.org/LICENSE_1_0.txt)
+
+'''
+Produces any number of outputs from a single pass over a bjam --out-xml
+log. The log is parsed once, and each element read is given to all the
+consumers that handle it: the process_jam_log.py translator, for the
+results XML and the Dart submissions, and the build_log.py processor, for
+the console summary, JSON lines, JUnit, and timing analytics.
+
+Usage:
+
+    log_pipeline.py [options] log.xml
+
+Each output is written to the file given for it, or to the standard
+output for '-'. The log can be compressed with gzip, bzip2, or xz.
+'''
+
+import optparse
+import os
+import sys
+import xml.dom
+import xml.dom.pulldom
+from bjam_log import add_action_category_option, open_log
+
+class LogPipeline(object):
+    '''
+    Parses a log once, giving each element to the handlers of all the
+    consumers. A consumer is a handler registry, and optionally a function
+    to add what its handlers return. An element is expanded when any of the
+    consumers has a handler for it. The consumers that don't, get the
+    descendants of the element they do have handlers for.
+    '''
+
+    def __init__(self):
+        self.consumers = []
+
+    def add_consumer(self, registry, add = None):
+        self.consumers.append((registry,add))
+
+    def parse(self, source):
+        events = xml.dom.pulldom.parse(source)
+        context = []
+        for (event,node) in events:
+            if event == xml.dom.pulldom.START_ELEMENT:
+                context.append(node.nodeName)
+                if node.nodeType == xml.dom.Node.ELEMENT_NODE:
+                    path = tuple(context)
+                    handlers = [ registry.resolve(path) for (registry,add) in self.consumers ]
+                    if any(handlers):
+                        events.expandNode(node)
+                        # expanding eats the end element, hence walking us out one level
+                        context.pop()
+                        for (x_f,consumer) in zip(handlers,self.consumers):
+                            if x_f:
+                                self.handle(consumer,x_f,node)
+                            else:
+                                self.dispatch_children(consumer,node,path)
+            elif event == xml.dom.pulldom.END_ELEMENT:
+                context.pop()
+
+    def handle(self, consumer, x_f, node):
+        result = x_f(node)
+        if consumer[1]:
+            consumer[1](result)
+
+    def dispatch_children(self, consumer, node, path):
+        for child in node.childNodes:
+            if child.nodeType == xml.dom.Node.ELEMENT_NODE:
+                child_path = path+(child.nodeName,)
+                x_f = consumer[0].resolve(child_path)
+                if x_f:
+                    self.handle(consumer,x_f,child)
+                else:
+                    self.dispatch_children(consumer,child,child_path)
+
+class DartSink(object):
+    '''
+    Collects the Dart submissions, one per toolset, from the test logs of the
+    translated results. And submits them to the Dart server, and or writes
+    them to a directory.
+    '''
+
+    def __init__(self, translator, runner, tag, platform, run_type):
+        self.translator = translator
+        self.runner = runner
+        self.tag = tag
+        self.platform = platform
+        self.run_type = run_type
+        self.dart_dom = {}
+
+    def add_item(self, item):
+        from collect_and_upload_logs import add_dart_test_log
+        if item.nodeName == 'test-log':
+            add_dart_test_log(self.dart_dom,item.toxml('utf-8'),
+                self.runner,self.tag,self.platform,
+                self.translator.results.documentElement.getAttribute('timestamp'),
+                self.run_type)
+
+    def submit(self, dart_server, http_proxy = None):
+        from collect_and_upload_logs import submit_dart
+        submit_dart(self.dart_dom,dart_server,self.tag,http_proxy)
+
+    def write(self, directory):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        for (toolset,dom) in self.dart_dom.items():
+            out = open(os.path.join(directory,'%s.xml' % toolset),'w')
+            out.write(dom.toxml('utf-8'))
+            out.close()
+
+class Main(object):
+
+    def __init__(self, args = None):
+        op = optparse.OptionParser(
+            usage="%prog [options] log.xml")
+        op.add_option( '--results',
+            help="write the results XML, as process_jam_log.py does, to the file",
+            metavar='FILE' )
+        op.add_option( '--console',
+            help="write the console summary, as build_log.py does, to the file",
+            metavar='FILE' )
+        op.add_option( '--jsonl',
+            help="write the tests as JSON lines to the file",
+            metavar='FILE' )
+        op.add_option( '--junit',
+            help="write the tests as JUnit XML to the file",
+            metavar='FILE' )
+        op.add_option( '--analytics',
+            help="write the timing analytics to the file",
+            metavar='FILE' )
+        op.add_option( '--top',
+            help="with analytics, the number of slowest actions shown (default 20)",
+            type='int', default=20 )
+        op.add_option( '--dart-server',
+            help="submit the results to the Dart server" )
+        op.add_option( '--dart-output',
+            help="write the Dart submissions to the directory, one file per toolset",
+            metavar='DIR' )
+        op.add_option( '--http-proxy',
+            help="the HTTP proxy for the Dart server" )
+        op.add_option( '--runner',
+            help="runner ID (e.g. 'Metacomm')" )
+        op.add_option( '--comment',
+            help="an HTML comment file to be inserted in the results" )
+        op.add_option( '--tag', default='trunk',
+            help="the tag for the results" )
+        op.add_option( '--platform', default='' )
+        op.add_option( '--source', default='SVN' )
+        op.add_option( '--revision' )
+        op.add_option( '--incremental',
+            help="the results are of an incremental run",
+            action='store_true' )
+        add_action_category_option(op)
+        ( opt, inputs ) = op.parse_args(args)
+        if len(inputs) != 1:
+            op.error("a single log is needed")
+        self.failed = False
+        pipeline = LogPipeline()
+
+        translator = None
+        dart = None
+        if opt.results or opt.dart_server or opt.dart_output:
+            from process_jam_log import BJamLog2Results
+            translator_args = [
+                '--output='+self.output_path(opt.results or os.devnull),
+                '--tag='+opt.tag,
+                '--platform='+opt.platform,
+                '--source='+opt.source,
+                '--stream' ]
+            for (name,value) in (('runner',opt.runner),('comment',opt.comment),
+                ('revision',opt.revision)):
+                if value is not None:
+                    translator_args.append('--%s=%s' % (name,value))
+            if opt.incremental:
+                translator_args.append('--incremental')
+            for category in opt.action_category or []:
+                translator_args.append('--action-category='+category)
+            translator = BJamLog2Results(translator_args+inputs,process=False)
+            translator.start_output()
+            pipeline.add_consumer(translator.registry,translator.add_items)
+            if opt.dart_server or opt.dart_output:
+                dart = DartSink(translator,opt.runner,opt.tag,opt.platform,
+                    'incremental' if opt.incremental else 'full')
+                translator.item_listener = dart.add_item
+
+        bop = None
+        reports = []
+        if opt.console or opt.jsonl or opt.junit or opt.analytics:
+            from build_log import BuildOutputProcessor, BuildConsoleSummaryReport
+            from build_log import BuildJSONLinesReport, BuildJUnitReport, BuildAnalyticsReport
+            bop = BuildOutputProcessor([],action_categories=opt.action_category)
+            streams = []
+            for (path,report) in ((opt.jsonl,BuildJSONLinesReport),(opt.junit,BuildJUnitReport)):
+                if path:
+                    out = self.open_output(path)
+                    streams.append(report(bop,opt,out=out))
+                    reports.append((streams[-1],None))
+            for (path,report) in ((opt.console,BuildConsoleSummaryReport),(opt.analytics,BuildAnalyticsReport)):
+                if path:
+                    reports.append((report(bop,opt),path))
+            for stream in streams:
+                stream.start()
+            if streams:
+                def test_complete(test):
+                    for stream in streams:
+                        stream.test_complete(test)
+                bop.test_listener = test_complete
+            pipeline.add_consumer(bop.registry)
+
+        source = open_log(inputs[0])
+        pipeline.parse(source)
+        if source is not inputs[0]:
+            source.close()
+
+        if translator:
+            translator.end_log()
+            translator.end()
+        if dart:
+            if opt.dart_output:
+                dart.write(opt.dart_output)
+            if opt.dart_server:
+                dart.submit(opt.dart_server,opt.http_proxy)
+        for (report,path) in reports:
+            if path:
+                self.redirect(path,report.generate)
+            else:
+                report.generate()
+                if report.out is not sys.stdout:
+                    report.out.close()
+            self.failed = self.failed or report.failed
+
+    def output_path(self, path):
+        if path == '-':
+            return ''
+        return path
+
+    def open_output(self, path):
+        if path == '-':
+            return sys.stdout
+        return open(path,'w')
+
+    def redirect(self, path, generate):
+        '''
+        Generate a report printed to the standard output into the file.
+        '''
+        out = self.open_output(path)
+        stdout = sys.stdout
+        sys.stdout = out
+        try:
+            generate()
+        finally:
+            sys.stdout = stdout
+            if out is not stdout:
+                out.close()
+
+if __name__ == '__main__':
+    m = Main()
+    if m.failed:
+        exit(-1)
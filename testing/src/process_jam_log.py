@@ -9,13 +9,32 @@ import optparse
 import time
 import xml.dom.minidom
 import xml.dom.pulldom
-from xml.sax.saxutils import unescape, escape
+import xml.sax
+try:
+    import xml.etree.cElementTree as ElementTree
+except ImportError:
+    import xml.etree.ElementTree as ElementTree
+from xml.sax.saxutils import unescape, escape, XMLGenerator
+from xml.sax.xmlreader import AttributesImpl
 import os.path
+import sys
+import hashlib
+import cPickle
+from cStringIO import StringIO
+from bjam_log import HandlerRegistry, TargetGraph, ActionClassifier, ActionScanner, SegmentReader, complement_ranges
+from bjam_log import Profiler, FollowReader, ParseCache, resume_segments, last_action_end
+from bjam_log import log_compression, open_log, add_action_category_option
+from bjam_log import OutputStore, elide
+from result_pack import PackWriter
+from bjam_log import read_action, read_target, read_fields, element_attribute, element_text
 
 #~ Process a bjam XML log into the XML log format for Boost result processing.
 class BJamLog2Results:
 
-    def __init__(self,args=None):
+    #~ The log given in the arguments is translated right away, unless not
+    #~ asked to process it. In which case the elements of a log can be given
+    #~ to the translators, and the items returned added, by the caller.
+    def __init__(self,args=None,process=True):
         opt = optparse.OptionParser(
             usage="%prog [options] input")
         opt.add_option( '--output',
@@ -29,6 +48,46 @@ class BJamLog2Results:
         opt.add_option( '--incremental',
             help="do incremental run (do not remove previous binaries)",
             action='store_true' )
+        opt.add_option( '--engine',
+            help="XML parsing engine, 'pulldom' (default) or 'iterparse'",
+            type='choice', choices=['pulldom','iterparse'] )
+        opt.add_option( '--stream',
+            help="write each test log as soon as it's complete",
+            action='store_true' )
+        opt.add_option( '--dispatch-stats',
+            help="print the number of elements seen for each element path",
+            action='store_true' )
+        opt.add_option( '--jobs', '-j',
+            help="number of processes to translate the build actions with",
+            type='int' )
+        add_action_category_option(opt)
+        opt.add_option( '--follow',
+            help="process the log while it's being written, writing each test log as soon as it's complete",
+            action='store_true' )
+        opt.add_option( '--follow-timeout',
+            help="with --follow, the seconds without the log growing after which it's taken as ended (default 600)",
+            type='float' )
+        opt.add_option( '--checkpoint',
+            help="save the state reached to the file, and resume from it when processing the same log after more was appended to it, with --stream the test logs not complete yet are written by the run that completes them",
+            metavar='FILE' )
+        opt.add_option( '--cache-dir',
+            help="keep the results translated from the log in the directory, and use them instead of translating the same log again",
+            metavar='DIR' )
+        opt.add_option( '--output-store',
+            help="write each distinct action output once to the directory, and refer to the repeats of it by digest",
+            metavar='DIR' )
+        opt.add_option( '--action-output-limit',
+            help="the bytes of output kept for each action, keeping the head and tail",
+            type='int', metavar='BYTES' )
+        opt.add_option( '--test-output-limit',
+            help="the bytes of output kept for each test log, keeping the head and tail",
+            type='int', metavar='BYTES' )
+        opt.add_option( '--pack',
+            help="also write the test logs to the file, as a binary result pack",
+            metavar='FILE' )
+        opt.add_option( '--profile',
+            help="time the element handlers and helpers, and write the profile as JSON to the file",
+            metavar='FILE' )
         opt.add_option( '--platform' )
         opt.add_option( '--source' )
         opt.add_option( '--revision' )
@@ -40,8 +99,26 @@ class BJamLog2Results:
         self.platform=''
         self.source='SVN'
         self.revision=None
+        self.engine='pulldom'
+        self.stream=False
+        self.dispatch_stats=False
+        self.jobs=1
+        self.action_category=[]
+        self.follow=False
+        self.follow_timeout=600.0
+        self.profile=None
+        self.checkpoint=None
+        self.cache_dir=None
+        self.cache_entry=None
+        self.output_store=None
+        self.pack=None
+        self.action_output_limit=None
+        self.test_output_limit=None
         self.input = []
         ( _opt_, self.input ) = opt.parse_args(args,self)
+        if self.follow:
+            self.stream = True
+            self.jobs = 1
         if self.incremental:
             run_type = 'incremental'
         else:
@@ -67,51 +144,426 @@ class BJamLog2Results:
         
         self.test = {}
         self.target_to_test = {}
-        self.target = {}
-        self.parent = {}
+        self.targets = TargetGraph()
+        self.classifier = ActionClassifier(self.action_category)
         self.log = {}
+        self.log_size = {}
+        self.writer = None
+        if self.output_store:
+            self.output_store = OutputStore(self.output_store)
+        if self.pack:
+            self.pack = PackWriter(self.pack)
+        self.registry = HandlerRegistry(self,stats=self.dispatch_stats)
+        self.profiler = None
+        if self.profile:
+            self.profiler = Profiler()
+            self.instrument(self.profiler)
+        #~ Called with each item added to the result.
+        self.item_listener = None
         
-        self.add_log()
-        self.gen_output()
+        if process:
+            self.process()
         
         #~ print self.test
         #~ print self.target
     
+    def process(self):
+        if self.stream:
+            self.start_output()
+        self.add_log()
+        self.end()
+    
+    #~ Write the output, once all of the log was translated.
+    def end(self):
+        self.gen_output()
+        if self.pack:
+            self.pack.close()
+        self.registry.print_stats()
+        if self.profiler:
+            self.profiler.report()
+            self.profiler.save(self.profile)
+    
+    #~ Profile the handlers, the helpers they use, and the reading of the
+    #~ elements. The bytes of action output handled are added up too. With
+    #~ multiple jobs only the work done in this process is profiled.
+    def instrument(self, profiler):
+        profiler.instrument_handlers(self)
+        profiler.instrument(self,[
+            'parse_log','add_items','get_action_result','add_action_result','get_action_data',
+            'get_test','get_log','get_log_attributes','get_action_info',
+            'get_action_output','get_target_directory','get_toolset',
+            'flush_log','gen_output'],
+            sizes={ 'get_action_output' : len })
+        profiler.instrument(sys.modules[__name__],[
+            'read_action','read_target','read_fields'])
+    
+    #~ The events of the XML parser, which are timed when profiling.
+    def profile_events(self, name, events):
+        if self.profiler:
+            return self.profiler.iterate(name,events)
+        return events
+    
     def add_log(self):
         if self.input[0]:
             bjam_xml = self.input[0]
         else:
             bjam_xml = self.input[1]
+        cache = None
+        if self.cache_dir and not self.follow:
+            cache = ParseCache(self.cache_dir,self.cache_fingerprint())
+            cached = cache.load([bjam_xml])
+            if cached is not None:
+                self.add_log_cached(cached)
+                return
+        #~ A compressed log is translated as it's decompressed, which rules
+        #~ out the checkpoints and jobs as they need the log mapped in memory.
+        if not self.follow and log_compression(bjam_xml) \
+            and (self.checkpoint or self.jobs > 1):
+            sys.stderr.write("The log '%s' is compressed, translating it with a single job and no checkpoint.\n" % bjam_xml)
+            self.checkpoint = None
+            self.jobs = 1
+        resume = None
+        if self.checkpoint and not self.follow:
+            resume = self.restore_checkpoint(bjam_xml)
+        if cache and resume is None:
+            self.cache_entry = cache.create([bjam_xml])
+        if resume is not None:
+            self.add_log_resumed(bjam_xml,resume)
+        elif self.follow:
+            self.add_log_follow(bjam_xml)
+        elif self.jobs > 1:
+            self.add_log_jobs(bjam_xml)
+        else:
+            self.add_log_serial(bjam_xml)
+        if self.checkpoint and not self.follow:
+            self.save_checkpoint(bjam_xml)
+            #~ When streaming, the test logs still open are kept in the
+            #~ checkpoint, and only written by the run that completes them.
+            if self.writer:
+                self.log = {}
+        self.end_log()
+    
+    #~ Add the log items now that we've collected all of them.
+    def end_log(self):
+        self.add_items(self.log.values())
+        if self.cache_entry:
+            self.cache_entry.close()
+            self.cache_entry = None
+    
+    #~ The cache has the timestamp and the items translated from the log, in
+    #~ the order they were produced, as XML text. Which are added again as
+    #~ if translated, both for the output and the pack. The comment file is
+    #~ read, and the results are written to the output store, when first
+    #~ translated, hence they are part of the fingerprint.
+    def cache_fingerprint(self):
+        comment = None
+        if self.comment and os.path.exists(self.comment):
+            comment = (os.path.abspath(self.comment),
+                os.path.getsize(self.comment),os.path.getmtime(self.comment))
+        output_store = None
+        if self.output_store:
+            output_store = os.path.abspath(self.output_store.directory)
+        return ('process_jam_log',1,self.action_category,comment,output_store,
+            self.action_output_limit,self.test_output_limit)
+    
+    def add_log_cached(self, cached):
+        for (kind,value) in cached:
+            if kind == 'timestamp':
+                self.results.documentElement.setAttribute('timestamp',value)
+            else:
+                self.add_items([ self.results.importNode(
+                    xml.dom.minidom.parseString(value).documentElement,True) ])
+    
+    #~ Translate the whole log in a single pass, as it's decompressed if
+    #~ it's compressed.
+    def add_log_serial(self, bjam_xml):
+        source = open_log(bjam_xml)
+        self.parse_log(source)
+        if source is not bjam_xml:
+            source.close()
+    
+    def parse_log(self, source):
+        if self.engine == 'iterparse':
+            self.add_log_iterparse(source)
+        else:
+            self.add_log_pulldom(source)
+    
+    #~ Translate only what was appended to the log since the checkpoint.
+    def add_log_resumed(self, bjam_xml, offset):
+        (bjam_xml_f,data) = self.map_log(bjam_xml)
+        self.parse_log(SegmentReader(data,resume_segments(data,offset)))
+        data.close()
+        bjam_xml_f.close()
+    
+    #~ The checkpoint has the state reached after the last action of the
+    #~ log: the tests, the targets, and the test logs. The test logs are kept
+    #~ as XML text. When streaming, the test logs already written are not in
+    #~ the checkpoint, and are not written again when resuming. While those
+    #~ still open are only in the checkpoint, and not written until they
+    #~ are complete. The log is identified by digests of its start and of
+    #~ the data before the offset.
+    checkpoint_version = 2
+    
+    def save_checkpoint(self, bjam_xml):
+        mapped = self.map_log(bjam_xml)
+        if not mapped:
+            return
+        (bjam_xml_f,data) = mapped
+        offset = last_action_end(data)
+        state = {
+            'version' : self.checkpoint_version,
+            'offset' : offset,
+            'digests' : self.checkpoint_digests(data,offset),
+            'action-category' : self.action_category,
+            'timestamp' : self.results.documentElement.getAttribute('timestamp'),
+            'test' : self.test,
+            'target-to-test' : self.target_to_test,
+            'targets' : self.targets,
+            'log' : dict([ (k,v.toxml('utf-8')) for (k,v) in self.log.items() ]),
+            'log-size' : self.log_size,
+            'output-seen' : None
+            }
+        if self.output_store:
+            state['output-seen'] = self.output_store.seen
+        data.close()
+        bjam_xml_f.close()
+        checkpoint_tmp = self.checkpoint+'.tmp'
+        checkpoint_f = open(checkpoint_tmp,'wb')
+        cPickle.dump(state,checkpoint_f,cPickle.HIGHEST_PROTOCOL)
+        checkpoint_f.close()
+        if os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+        os.rename(checkpoint_tmp,self.checkpoint)
+    
+    #~ Restore the state from the checkpoint, if it's for the log. Returns
+    #~ the offset to resume at, or None to process the whole log.
+    def restore_checkpoint(self, bjam_xml):
+        if not os.path.exists(self.checkpoint):
+            return None
+        checkpoint_f = open(self.checkpoint,'rb')
+        try:
+            try:
+                state = cPickle.load(checkpoint_f)
+            except Exception:
+                state = {}
+        finally:
+            checkpoint_f.close()
+        mapped = self.map_log(bjam_xml)
+        if not mapped:
+            return None
+        (bjam_xml_f,data) = mapped
+        valid = state.get('version') == self.checkpoint_version \
+            and state['offset'] <= len(data) \
+            and state['action-category'] == self.action_category \
+            and state['digests'] == self.checkpoint_digests(data,state['offset'])
+        data.close()
+        bjam_xml_f.close()
+        if not valid:
+            sys.stderr.write("Ignoring checkpoint '%s', it's not for this log.\n" % self.checkpoint)
+            return None
+        self.results.documentElement.setAttribute('timestamp',state['timestamp'])
+        self.test = state['test']
+        self.target_to_test = state['target-to-test']
+        self.targets = state['targets']
+        self.log_size = state['log-size']
+        if self.output_store and state['output-seen']:
+            self.output_store.seen = state['output-seen']
+        for (target_directory,log) in state['log'].items():
+            self.log[target_directory] = self.results.importNode(
+                xml.dom.minidom.parseString(log).documentElement,True)
+        return state['offset']
+    
+    def checkpoint_digests(self, data, offset):
+        return (
+            hashlib.sha1(data[0:min(offset,4096)]).hexdigest(),
+            hashlib.sha1(data[max(offset-4096,0):offset]).hexdigest())
+    
+    #~ Map the log file into memory, returning the file and the map. Or None
+    #~ for an empty log, which can't be mapped.
+    def map_log(self, bjam_xml):
+        import mmap
+        bjam_xml_f = open(bjam_xml,'rb')
+        if os.fstat(bjam_xml_f.fileno()).st_size == 0:
+            bjam_xml_f.close()
+            return None
+        return (bjam_xml_f,mmap.mmap(bjam_xml_f.fileno(),0,access=mmap.ACCESS_READ))
+    
+    #~ Translate the log as it's being written by a running build. The
+    #~ test logs get written out as their result actions are read. If the
+    #~ build never closes the log, what was read up to then is kept.
+    def add_log_follow(self, bjam_xml):
+        source = FollowReader(bjam_xml,idle_timeout=self.follow_timeout)
+        try:
+            self.parse_log(source)
+        except (xml.sax.SAXParseException,SyntaxError):
+            if source.complete:
+                raise
+        source.close()
+    
+    #~ Translate the log with multiple processes. The tests and targets are
+    #~ read here first, by parsing the log with all the actions cut out. The
+    #~ actions are then split into batches of consecutive actions which the
+    #~ worker processes translate. The translated results are added in the
+    #~ order of the batches, so the output is the same as for a single job.
+    def add_log_jobs(self, bjam_xml):
+        import multiprocessing
+        mapped = self.map_log(bjam_xml)
+        if not mapped:
+            #~ An empty log can't be mapped, it's parsed as is instead.
+            self.add_log_serial(bjam_xml)
+            return
+        (bjam_xml_f,data) = mapped
+        (begins,ends) = ActionScanner(data).ranges()
+        self.parse_log(SegmentReader(data,complement_ranges(begins,ends,len(data))))
+        self.targets.compute_roots()
+        pool = multiprocessing.Pool(self.jobs,_init_action_worker,(self,bjam_xml))
+        try:
+            for results in pool.imap(_translate_actions,self.action_batches(begins,ends)):
+                for action in results:
+                    self.add_action_result(action)
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        pool.join()
+        data.close()
+        bjam_xml_f.close()
+    
+    #~ Split the actions into batches of roughly even size. There are more
+    #~ batches than jobs to even out the load of the workers.
+    def action_batches(self, begins, ends):
+        if not begins:
+            return
+        batch_size = (ends[-1]-begins[0])/(self.jobs*16)+1
+        i = 0
+        while i < len(begins):
+            j = i+1
+            while j < len(begins) and ends[j-1]-begins[i] < batch_size:
+                j += 1
+            yield (begins[i:j],ends[i:j])
+            i = j
+    
+    #~ Used by the worker processes to translate a batch of actions.
+    def translate_actions(self, begins, ends):
+        actions = ['<build>']
+        for i in xrange(len(begins)):
+            actions.append(self.data[begins[i]:ends[i]])
+        actions.append('</build>')
+        results = []
+        for (event,element) in ElementTree.iterparse(StringIO(''.join(actions))):
+            if element.tag == 'action':
+                results.append(self.get_action_result(read_action(element)))
+                element.clear()
+        return results
+    
+    #~ Only the tests and targets are needed to translate actions. Which is
+    #~ what gets passed on to the worker processes.
+    def __getstate__(self):
+        return {
+            'test' : self.test,
+            'target_to_test' : self.target_to_test,
+            'targets' : self.targets,
+            'classifier' : self.classifier
+            }
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.results = xml.dom.minidom.Document()
+        self.profiler = None
+        self.cache_entry = None
+        self.item_listener = None
+    
+    #~ Walk the log with pulldom, expanding the nodes we have translators for.
+    def add_log_pulldom(self, bjam_xml):
         events = xml.dom.pulldom.parse(bjam_xml)
+        if self.profiler:
+            events.expandNode = self.profiler.wrap('expandNode',events.expandNode)
         context = []
-        test_run = self.results.documentElement
-        for (event,node) in events:
+        for (event,node) in self.profile_events('pulldom',events):
             if event == xml.dom.pulldom.START_ELEMENT:
-                context.append(node)
+                context.append(node.nodeName)
                 if node.nodeType == xml.dom.Node.ELEMENT_NODE:
-                    x_f = self.x_name_(*context)
+                    x_f = self.registry.resolve(tuple(context))
                     if x_f:
                         events.expandNode(node)
                         # expanding eats the end element, hence walking us out one level
                         context.pop()
                         # call the translator, and add returned items to the result
-                        items = (x_f[1])(node)
-                        if items:
-                            for item in items:
-                                if item:
-                                    test_run.appendChild(self.results.createTextNode("\n"))
-                                    test_run.appendChild(item)
+                        self.add_items(x_f(node))
             elif event == xml.dom.pulldom.END_ELEMENT:
                 context.pop()
-        #~ Add the log items nwo that we've collected all of them.
-        items = self.log.values()
+    
+    #~ Walk the log as a stream of elements. Only the subtree of the element
+    #~ being translated is kept, everything else is discarded as soon as it
+    #~ ends. Which keeps memory use flat regardless of the size of the log.
+    #~ The translators get the ElementTree elements, instead of DOM nodes.
+    def add_log_iterparse(self, bjam_xml):
+        context = []
+        elements = []
+        x_f = None
+        for (event,element) in self.profile_events('iterparse',
+            ElementTree.iterparse(bjam_xml,events=('start','end'))):
+            if event == 'start':
+                context.append(element.tag)
+                elements.append(element)
+                if not x_f:
+                    x_f = self.registry.resolve(tuple(context))
+                    if x_f:
+                        x_depth = len(context)
+            else:
+                if x_f and len(context) == x_depth:
+                    # call the translator, and add returned items to the result
+                    self.add_items(x_f(element))
+                    x_f = None
+                context.pop()
+                elements.pop()
+                if not x_f:
+                    element.clear()
+                    if elements:
+                        elements[-1].remove(element)
+    
+    #~ Append the items returned by a translator to the result. When streaming
+    #~ they get written out right away instead.
+    def add_items(self, items):
+        test_run = self.results.documentElement
         if items:
             for item in items:
                 if item:
-                    test_run.appendChild(self.results.createTextNode("\n"))
-                    test_run.appendChild(item)
+                    if self.item_listener:
+                        self.item_listener(item)
+                    if self.cache_entry:
+                        self.cache_entry.dump(('item',item.toxml('utf-8')))
+                    if self.pack and item.nodeName == 'test-log':
+                        self.pack_log(item)
+                    if self.writer:
+                        self.write_item(item)
+                    else:
+                        test_run.appendChild(self.results.createTextNode("\n"))
+                        test_run.appendChild(item)
+    
+    #~ Add a complete test log to the result pack. Each result section of the
+    #~ log goes in as an action.
+    def pack_log(self, log):
+        actions = []
+        result = 'succeed'
+        for node in log.childNodes:
+            if node.nodeType == xml.dom.Node.ELEMENT_NODE:
+                actions.append({
+                    'type' : node.nodeName,
+                    'result' : node.getAttribute('result'),
+                    'start' : node.getAttribute('timestamp'),
+                    'output' : self.get_data(node,default='')
+                    })
+                if actions[-1]['result'] == 'fail':
+                    result = 'fail'
+        self.pack.add_test(log.getAttribute('library'),log.getAttribute('test-name'),
+            log.getAttribute('test-type'),log.getAttribute('toolset'),
+            log.getAttribute('target-directory'),result,actions)
     
     def gen_output(self):
+        if self.writer:
+            self.end_output()
+            return
         if self.output:
             out = open(self.output,'w')
         else:
@@ -119,27 +571,58 @@ class BJamLog2Results:
         if out:
             self.results.writexml(out,encoding='utf-8')
     
+    #~ Streamed output, the items are written with a SAX generator as they
+    #~ are produced. The test-run element is started lazily as the attributes
+    #~ it carries are only known after reading the start of the log.
+    def start_output(self):
+        if self.output:
+            self.writer_out = open(self.output,'w')
+        else:
+            self.writer_out = sys.stdout
+        self.writer = XMLGenerator(self.writer_out,'utf-8')
+        self.writer.startDocument()
+        self.writer_started = False
+    
+    def write_item(self, item):
+        if not self.writer_started:
+            self.write_start(self.results.documentElement)
+            self.writer_started = True
+        self.writer.characters("\n")
+        self.write_node(item)
+    
+    def end_output(self):
+        test_run = self.results.documentElement
+        if not self.writer_started:
+            self.write_start(test_run)
+            self.writer_started = True
+        self.writer.endElement(test_run.nodeName)
+        self.writer.endDocument()
+        if self.writer_out is not sys.stdout:
+            self.writer_out.close()
+    
+    def write_start(self, node):
+        self.writer.startElement(node.nodeName,
+            AttributesImpl(dict(node.attributes.items())))
+    
+    def write_node(self, node):
+        if node.nodeType == xml.dom.Node.ELEMENT_NODE:
+            self.write_start(node)
+            for child in node.childNodes:
+                self.write_node(child)
+            self.writer.endElement(node.nodeName)
+        elif node.nodeType == xml.dom.Node.TEXT_NODE:
+            self.writer.characters(node.data)
+    
+    #~ Write out, and forget, a test log that will not get any more results.
+    def flush_log(self, target_directory):
+        if self.writer and target_directory in self.log:
+            self.add_items([self.log.pop(target_directory)])
+            if self.follow:
+                self.writer_out.flush()
+    
     def tostring(self):
         return self.results.toxml('utf-8')
     
-    def x_name_(self, *context, **kwargs):
-        node = None
-        names = [ ]
-        for c in context:
-            if c:
-                if not isinstance(c,xml.dom.Node):
-                    suffix = '_'+c.replace('-','_').replace('#','_')
-                else:
-                    suffix = '_'+c.nodeName.replace('-','_').replace('#','_')
-                    node = c
-                names.append('x')
-                names = map(lambda x: x+suffix,names)
-        if node:
-            for name in names:
-                if hasattr(self,name):
-                    return (name,getattr(self,name))
-        return None
-    
     def x(self, *context, **kwargs):
         node = None
         names = [ ]
@@ -163,7 +646,9 @@ class BJamLog2Results:
     #~ The timestamp goes to the corresponding attribute in the result.
     def x_build_timestamp( self, node ):
         test_run = self.results.documentElement
-        test_run.setAttribute('timestamp',self.get_data(node).strip())
+        test_run.setAttribute('timestamp',element_text(node).strip())
+        if self.cache_entry:
+            self.cache_entry.dump(('timestamp',test_run.getAttribute('timestamp')))
         return None
     
     #~ Comment file becomes a comment node.
@@ -180,16 +665,16 @@ class BJamLog2Results:
     
     #~ Tests are remembered for future reference.
     def x_build_test( self, node ):
-        test_run = self.results.documentElement
         test_node = node
-        test_name = test_node.getAttribute('name')
+        test_name = element_attribute(test_node,'name')
+        test_fields = read_fields(test_node)
         self.test[test_name] = {
             'library' : '/'.join(test_name.split('/')[0:-1]),
             'test-name' : test_name.split('/')[-1],
-            'test-type' : test_node.getAttribute('type').lower(),
-            'test-program' : self.get_child_data(test_node,tag='source',strip=True),
-            'target' : self.get_child_data(test_node,tag='target',strip=True),
-            'info' : self.get_child_data(test_node,tag='info',strip=True)
+            'test-type' : element_attribute(test_node,'type').lower(),
+            'test-program' : test_fields.get('source','').strip(),
+            'target' : test_fields.get('target','').strip(),
+            'info' : test_fields.get('info','').strip()
             }
         #~ Add a lookup for the test given the test target.
         self.target_to_test[self.test[test_name]['target']] = test_name
@@ -199,64 +684,38 @@ class BJamLog2Results:
     #~ Process the target dependency DAG into an ancestry tree so we can look up
     #~ which top-level library and test targets specific build actions correspond to.
     def x_build_targets_target( self, node ):
-        test_run = self.results.documentElement
-        target_node = node
-        name = self.get_child_data(target_node,tag='name',strip=True)
-        path = self.get_child_data(target_node,tag='path',strip=True)
-        jam_target = self.get_child_data(target_node,tag='jam-target',strip=True)
+        (name,path,jam_target,dependencies) = read_target(node)
         #~ print "--- target :: %s" %(name)
-        #~ Map for jam targets to virtual targets.
-        self.target[jam_target] = {
-            'name' : name,
-            'path' : path
-            }
-        #~ Create the ancestry.
-        dep_node = self.get_child(self.get_child(target_node,tag='dependencies'),tag='dependency')
-        while dep_node:
-            child = self.get_data(dep_node,strip=True)
-            child_jam_target = '<p%s>%s' % (path,child.split('//',1)[1])
-            self.parent[child_jam_target] = jam_target
-            #~ print "--- %s\n  ^ %s" %(jam_target,child_jam_target)
-            dep_node = self.get_sibling(dep_node.nextSibling,tag='dependency')
+        #~ Map for jam targets to virtual targets, and create the ancestry.
+        self.targets.add_target(jam_target,name,path,dependencies)
         return None
     
     #~ Given a build action log, process into the corresponding test log and
     #~ specific test log sub-part.
     def x_build_action( self, node ):
-        test_run = self.results.documentElement
-        action_node = node
-        name = self.get_child(action_node,tag='name')
+        self.add_action_result(self.get_action_result(read_action(node)))
+        return None
+    
+    #~ Translate a build action into the result to add to a test log, or
+    #~ None if the action doesn't show up in the results. This only reads the
+    #~ action, tests, and targets. Hence it's what the worker processes do
+    #~ when using multiple jobs.
+    def get_action_result( self, action ):
+        name = action.name
         if name:
-            name = self.get_data(name)
             #~ Based on the action, we decide what sub-section the log
             #~ should go into.
-            action_type = None
-            if re.match('[^%]+%[^.]+[.](compile)',name):
-                action_type = 'compile'
-            elif re.match('[^%]+%[^.]+[.](link|archive)',name):
-                action_type = 'link'
-            elif re.match('[^%]+%testing[.](capture-output)',name):
-                action_type = 'run'
-            elif re.match('[^%]+%testing[.](expect-failure|expect-success)',name):
-                action_type = 'result'
+            action_type = self.classifier.classify(name)
             #~ print "+   [%s] %s %s :: %s" %(action_type,name,'','')
             if action_type:
                 #~ Get the corresponding test.
-                (target,test) = self.get_test(action_node,type=action_type)
+                (target,test) = self.get_test(action,type=action_type)
                 #~ Skip action that have no correspoding test as they are
                 #~ regular build actions and don't need to show up in the
                 #~ regression results.
                 if not test:
                     return None
-                #~ And the log node, which we will add the results to.
-                log = self.get_log(action_node,test)
                 #~ print "--- [%s] %s %s :: %s" %(action_type,name,target,test)
-                #~ Collect some basic info about the action.
-                result_data = "%(info)s\n\n%(command)s\n%(output)s\n" % {
-                    'command' : self.get_action_command(action_node,action_type),
-                    'output' : self.get_action_output(action_node,action_type),
-                    'info' : self.get_action_info(action_node,action_type)
-                    }
                 #~ For the test result status we find the appropriate node
                 #~ based on the type of test. Then adjust the result status
                 #~ acorrdingly. This makes the result status reflect the
@@ -270,80 +729,116 @@ class BJamLog2Results:
                         action_tag = 'link'
                     elif re.match(r'^run',test['test-type']):
                         action_tag = 'run'
-                #~ The result sub-part we will add this result to.
-                result_node = self.get_child(log,tag=action_tag)
-                if action_node.getAttribute('status') == '0':
+                if action.status == '0':
                     action_result = 'succeed'
                 else:
                     action_result = 'fail'
-                if not result_node:
-                    #~ If we don't have one already, create it and add the result.
-                    result_node = self.new_text(action_tag,result_data,
-                        result = action_result,
-                        timestamp = action_node.getAttribute('start'))
-                    log.appendChild(self.results.createTextNode("\n"))
-                    log.appendChild(result_node)
-                else:
-                    #~ For an existing result node we set the status to fail
-                    #~ when any of the individual actions fail, except for result
-                    #~ status.
-                    if action_type != 'result':
-                        result = result_node.getAttribute('result')
-                        if action_node.getAttribute('status') != '0':
-                            result = 'fail'
-                    else:
-                        result = action_result
-                    result_node.setAttribute('result',result)
-                    result_node.appendChild(self.results.createTextNode("\n"))
-                    result_node.appendChild(self.results.createTextNode(result_data))
+                return {
+                    'target-directory' : self.get_target_directory(action),
+                    'test-log' : self.get_log_attributes(action,test),
+                    'type' : action_type,
+                    'tag' : action_tag,
+                    'result' : action_result,
+                    'timestamp' : action.start,
+                    #~ Collect some basic info about the action.
+                    'info' : self.get_action_info(action,action_type),
+                    'command' : self.get_action_command(action,action_type),
+                    'output' : self.get_action_output(action,action_type)
+                    }
         return None
     
+    #~ Add the result of an action to the test log it belongs to.
+    def add_action_result( self, action ):
+        if not action:
+            return
+        #~ And the log node, which we will add the results to.
+        log = self.get_log(action['target-directory'],action['test-log'])
+        data = self.get_action_data(action)
+        #~ The result sub-part we will add this result to.
+        result_node = self.get_child(log,tag=action['tag'])
+        if not result_node:
+            #~ If we don't have one already, create it and add the result.
+            result_node = self.new_text(action['tag'],data,
+                result = action['result'],
+                timestamp = action['timestamp'])
+            log.appendChild(self.results.createTextNode("\n"))
+            log.appendChild(result_node)
+        else:
+            #~ For an existing result node we set the status to fail
+            #~ when any of the individual actions fail, except for result
+            #~ status.
+            if action['type'] != 'result':
+                result = result_node.getAttribute('result')
+                if action['result'] == 'fail':
+                    result = 'fail'
+            else:
+                result = action['result']
+            result_node.setAttribute('result',result)
+            result_node.appendChild(self.results.createTextNode("\n"))
+            result_node.appendChild(self.results.createTextNode(data))
+        #~ The result action is the last one for a test, so the log
+        #~ is complete and can be written when streaming.
+        if action['type'] == 'result':
+            self.flush_log(action['target-directory'])
+    
+    #~ The text of an action result. Repeated outputs are replaced by a
+    #~ reference when storing outputs, and the output is shortened to fit
+    #~ the limits for the action and for the test log. This is done in
+    #~ order of the actions, so it's the same when using multiple jobs.
+    def get_action_data( self, action ):
+        output = action['output']
+        if self.output_store:
+            output = self.output_store.store(output)
+        if self.action_output_limit is not None:
+            output = elide(output,self.action_output_limit)
+        if self.test_output_limit is not None:
+            size = self.log_size.get(action['target-directory'],0)
+            output = elide(output,max(self.test_output_limit-size,0))
+            self.log_size[action['target-directory']] = size+len(output)
+        return "%(info)s\n\n%(command)s\n%(output)s\n" % {
+            'info' : action['info'],
+            'command' : action['command'],
+            'output' : output
+            }
+    
     #~ The command executed for the action. For run actions we omit the command
     #~ as it's just noise.
-    def get_action_command( self, action_node, action_type ):
+    def get_action_command( self, action, action_type ):
         if action_type != 'run':
-            return self.get_child_data(action_node,tag='command')
+            return action.command
         else:
             return ''
     
     #~ The command output.
-    def get_action_output( self, action_node, action_type ):
-        return self.get_child_data(action_node,tag='output',default='')
+    def get_action_output( self, action, action_type ):
+        return action.output
     
     #~ Some basic info about the action.
-    def get_action_info( self, action_node, action_type ):
-        info = ""
+    def get_action_info( self, action, action_type ):
+        info = []
         #~ The jam action and target.
-        info += "%s %s\n" %(self.get_child_data(action_node,tag='name'),
-            self.get_child_data(action_node,tag='path'))
+        info.append("%s %s\n" %(action.name,action.path))
         #~ The timing of the action.
-        info += "Time: (start) %s -- (end) %s -- (user) %s -- (system) %s\n" %(
-            action_node.getAttribute('start'), action_node.getAttribute('end'),
-            action_node.getAttribute('user'), action_node.getAttribute('system'))
+        info.append("Time: (start) %s -- (end) %s -- (user) %s -- (system) %s\n" %(
+            action.start, action.end, action.user, action.system))
         #~ And for compiles some context that may be hidden if using response files.
         if action_type == 'compile':
-            define = self.get_child(self.get_child(action_node,tag='properties'),name='define')
-            while define:
-                info += "Define: %s\n" %(self.get_data(define,strip=True))
-                define = self.get_sibling(define.nextSibling,name='define')
-        return info
+            for define in action.property_values('define'):
+                info.append("Define: %s\n" %(define))
+        return ''.join(info)
     
     #~ Find the test corresponding to an action. For testing targets these
     #~ are the ones pre-declared in the --dump-test option. For libraries
     #~ we create a dummy test as needed.
-    def get_test( self, node, type = None ):
-        jam_target = self.get_child_data(node,tag='jam-target')
-        base = self.target[jam_target]['name']
-        target = jam_target
-        while target in self.parent:
-            target = self.parent[target]
+    def get_test( self, action, type = None ):
+        jam_target = action.jam_target
+        base = self.targets.name(jam_target)
         #~ print "--- TEST: %s ==> %s" %(jam_target,target)
         #~ main-target-type is a precise indicator of what the build target is
         #~ proginally meant to be.
-        main_type = self.get_child_data(self.get_child(node,tag='properties'),
-            name='main-target-type',strip=True)
+        main_type = action.property('main-target-type')
         if main_type == 'LIB' and type:
-            lib = self.target[target]['name']
+            lib = self.targets.root_name(jam_target)
             if not lib in self.test:
                 self.test[lib] = {
                     'library' : re.search(r'libs/([^/]+)',lib).group(1),
@@ -354,7 +849,7 @@ class BJamLog2Results:
                     }
             test = self.test[lib]
         else:
-            target_name_ = self.target[target]['name']
+            target_name_ = self.targets.root_name(jam_target)
             if self.target_to_test.has_key(target_name_):
                 test = self.test[self.target_to_test[target_name_]]
             else:
@@ -362,32 +857,38 @@ class BJamLog2Results:
         return (base,test)
     
     #~ Find, or create, the test-log node to add results to.
-    def get_log( self, node, test ):
-        target_directory = os.path.dirname(self.get_child_data(
-            node,tag='path',strip=True))
-        target_directory = re.sub(r'.*[/\\]bin[.]v2[/\\]','',target_directory)
-        target_directory = re.sub(r'[\\]','/',target_directory)
+    def get_log( self, target_directory, attributes ):
         if not target_directory in self.log:
-            if 'info' in test and test['info'] == 'always_show_run_output':
-                show_run_output = 'true'
-            else:
-                show_run_output = 'false'
-            self.log[target_directory] = self.new_node('test-log',
-                library=test['library'],
-                test_name=test['test-name'],
-                test_type=test['test-type'],
-                test_program=test['test-program'],
-                toolset=self.get_toolset(node),
-                target_directory=target_directory,
-                show_run_output=show_run_output)
+            self.log[target_directory] = self.new_node('test-log',**attributes)
         return self.log[target_directory]
     
+    #~ The attributes of the test-log node for the test of an action.
+    def get_log_attributes( self, action, test ):
+        if 'info' in test and test['info'] == 'always_show_run_output':
+            show_run_output = 'true'
+        else:
+            show_run_output = 'false'
+        return {
+            'library' : test['library'],
+            'test_name' : test['test-name'],
+            'test_type' : test['test-type'],
+            'test_program' : test['test-program'],
+            'toolset' : self.get_toolset(action),
+            'target_directory' : self.get_target_directory(action),
+            'show_run_output' : show_run_output
+            }
+    
+    #~ The test log key, the target directory relative to the build root.
+    def get_target_directory( self, action ):
+        target_directory = os.path.dirname(action.path.strip())
+        target_directory = re.sub(r'.*[/\\]bin[.]v2[/\\]','',target_directory)
+        target_directory = re.sub(r'[\\]','/',target_directory)
+        return target_directory
+    
     #~ The precise toolset from the build properties.
-    def get_toolset( self, node ):
-        toolset = self.get_child_data(self.get_child(node,tag='properties'),
-            name='toolset',strip=True)
-        toolset_version = self.get_child_data(self.get_child(node,tag='properties'),
-            name='toolset-%s:version'%toolset,strip=True)
+    def get_toolset( self, action ):
+        toolset = action.property('toolset')
+        toolset_version = action.property('toolset-%s:version'%toolset)
         return '%s-%s' %(toolset,toolset_version)
     
     #~ XML utilities...
@@ -465,5 +966,18 @@ class BJamLog2Results:
             result.appendChild(self.results.createTextNode(data))
         return result
 
+#~ The state of the worker processes for multiple jobs.
+_action_worker = None
+
+def _init_action_worker(translator, bjam_xml):
+    import mmap
+    global _action_worker
+    _action_worker = translator
+    _action_worker.data_f = open(bjam_xml,'rb')
+    _action_worker.data = mmap.mmap(_action_worker.data_f.fileno(),0,access=mmap.ACCESS_READ)
+
+def _translate_actions(batch):
+    return _action_worker.translate_actions(*batch)
+
 
 if __name__ == '__main__': BJamLog2Results()
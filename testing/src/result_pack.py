@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+
+# Distributed under the Boost Software License, Version 1.0.
+# (See accompanying file LICENSE_1_0.txt or copy at
+# http://www.boost.org/LICENSE_1_0.txt)
+
+'''
+Compact binary container for the test results of a run, as an alternative
+to re-parsing the XML. The file has:
+
+* A header, with the magic and version.
+* The blobs, the command and output text of the actions. Identical blobs
+  are only stored once.
+* The string table, of all the other strings, each stored once.
+* The test records, with fixed width fields referring to the strings and
+  to the range of the actions of the test.
+* The action records, with fixed width fields referring to the strings,
+  and the offset and size of the blobs.
+* The index, the test records ordered by library, test name, and toolset.
+  And ordered by toolset, library, and test name.
+* A trailer, with the offsets of the sections.
+
+The reader maps the file in memory, and only reads the records and strings
+asked for. Finding a test is a binary search over the index.
+'''
+
+import hashlib
+import mmap
+import optparse
+import struct
+
+_magic = 'BRPK'
+_version = 1
+_header = struct.Struct('<4sI')
+_trailer = struct.Struct('<QQQQQIII4s')
+_string_offset = struct.Struct('<Q')
+_test = struct.Struct('<IIIIIIII')
+_action = struct.Struct('<IIIIIIIIQIQI')
+_index = struct.Struct('<I')
+
+class PackWriter(object):
+    '''
+    Writes a result pack file. The tests are added one at a time, with their
+    actions, and the file is complete once closed.
+    '''
+
+    def __init__(self, path):
+        self.out = open(path,'wb')
+        self.out.write(_header.pack(_magic,_version))
+        self.strings = {}
+        self.string_list = []
+        self.blobs = {}
+        self.tests = []
+        self.actions = []
+        self.keys = []
+        self.string('')
+
+    def string(self, s):
+        '''
+        The index of the string in the string table.
+        '''
+        if s is None:
+            s = ''
+        if isinstance(s,unicode):
+            s = s.encode('utf-8')
+        try:
+            return self.strings[s]
+        except KeyError:
+            i = self.strings[s] = len(self.string_list)
+            self.string_list.append(s)
+            return i
+
+    def blob(self, text):
+        '''
+        Write the text as a blob, unless already written, and return its
+        offset and size.
+        '''
+        if not text:
+            return (0,0)
+        if isinstance(text,unicode):
+            text = text.encode('utf-8')
+        digest = hashlib.sha1(text).digest()
+        try:
+            return self.blobs[digest]
+        except KeyError:
+            blob = self.blobs[digest] = (self.out.tell(),len(text))
+            self.out.write(text)
+            return blob
+
+    def add_test(self, library, test_name, test_type, toolset, target_directory,
+        result, actions):
+        '''
+        Add a test, and its actions. The actions are dictionaries with the
+        'type', 'result', 'name', 'path', 'start', 'end', 'user', 'system',
+        'command', and 'output' of each action. Missing ones are empty.
+        '''
+        first_action = len(self.actions)
+        for action in actions:
+            command = self.blob(action.get('command'))
+            output = self.blob(action.get('output'))
+            self.actions.append(_action.pack(
+                self.string(action.get('type')),
+                self.string(action.get('result')),
+                self.string(action.get('name')),
+                self.string(action.get('path')),
+                self.string(action.get('start')),
+                self.string(action.get('end')),
+                self.string(action.get('user')),
+                self.string(action.get('system')),
+                command[0],command[1],output[0],output[1]))
+        self.keys.append((
+            self.string_list[self.string(library)],
+            self.string_list[self.string(test_name)],
+            self.string_list[self.string(toolset)]))
+        self.tests.append(_test.pack(
+            self.string(library),
+            self.string(test_name),
+            self.string(test_type),
+            self.string(toolset),
+            self.string(target_directory),
+            self.string(result),
+            first_action,
+            len(self.actions)-first_action))
+
+    def close(self):
+        out = self.out
+        strings = out.tell()
+        offset = 0
+        for s in self.string_list:
+            out.write(_string_offset.pack(offset))
+            offset += len(s)
+        out.write(_string_offset.pack(offset))
+        for s in self.string_list:
+            out.write(s)
+        tests = out.tell()
+        out.write(''.join(self.tests))
+        actions = out.tell()
+        out.write(''.join(self.actions))
+        keys = self.keys
+        by_library = out.tell()
+        for i in sorted(xrange(len(keys)),key=lambda i: keys[i]):
+            out.write(_index.pack(i))
+        by_toolset = out.tell()
+        for i in sorted(xrange(len(keys)),key=lambda i: (keys[i][2],keys[i][0],keys[i][1])):
+            out.write(_index.pack(i))
+        out.write(_trailer.pack(strings,tests,actions,by_library,by_toolset,
+            len(self.string_list),len(self.tests),len(self.actions),_magic))
+        out.close()
+
+class PackReader(object):
+    '''
+    Reads a result pack file, mapped in memory. Tests are only read when
+    asked for, and their actions, and their command and output, only when
+    accessed.
+    '''
+
+    def __init__(self, path):
+        self.f = open(path,'rb')
+        self.data = mmap.mmap(self.f.fileno(),0,access=mmap.ACCESS_READ)
+        (magic,version) = _header.unpack_from(self.data,0)
+        if magic != _magic or version != _version:
+            raise ValueError("'%s' is not a version %d result pack" % (path,_version))
+        (self.strings,self.tests,self.actions,self.by_library,self.by_toolset,
+            self.string_count,self.test_count,self.action_count,magic) = \
+            _trailer.unpack_from(self.data,len(self.data)-_trailer.size)
+        if magic != _magic:
+            raise ValueError("'%s' is a truncated result pack" % path)
+        self.string_data = self.strings+_string_offset.size*(self.string_count+1)
+
+    def __len__(self):
+        return self.test_count
+
+    def close(self):
+        self.data.close()
+        self.f.close()
+
+    def string(self, i):
+        (begin,end) = struct.unpack_from('<QQ',self.data,self.strings+_string_offset.size*i)
+        return self.data[self.string_data+begin:self.string_data+end].decode('utf-8')
+
+    def blob(self, offset, size):
+        return self.data[offset:offset+size].decode('utf-8')
+
+    def test(self, i):
+        '''
+        The i-th test record.
+        '''
+        return PackTest(self,_test.unpack_from(self.data,self.tests+_test.size*i))
+
+    def action(self, i):
+        return PackAction(self,_action.unpack_from(self.data,self.actions+_action.size*i))
+
+    def __iter__(self):
+        for i in xrange(self.test_count):
+            yield self.test(i)
+
+    def index_key(self, index, position):
+        '''
+        The sort key of the test at the position of the index.
+        '''
+        (i,) = _index.unpack_from(self.data,index+_index.size*position)
+        (library,test_name,_,toolset) = _test.unpack_from(self.data,self.tests+_test.size*i)[0:4]
+        if index == self.by_library:
+            return (i,(self.string(library),self.string(test_name),self.string(toolset)))
+        else:
+            return (i,(self.string(toolset),self.string(library),self.string(test_name)))
+
+    def search(self, index, prefix):
+        '''
+        The tests whose index key starts with the prefix, in index order.
+        '''
+        prefix = tuple([ unicode(p) for p in prefix ])
+        low = 0
+        high = self.test_count
+        while low < high:
+            middle = (low+high)/2
+            if self.index_key(index,middle)[1][0:len(prefix)] < prefix:
+                low = middle+1
+            else:
+                high = middle
+        while low < self.test_count:
+            (i,key) = self.index_key(index,low)
+            if key[0:len(prefix)] != prefix:
+                return
+            yield self.test(i)
+            low += 1
+
+    def find(self, library, test_name = None, toolset = None):
+        '''
+        The tests of the library, optionally only the named test, and
+        optionally only for the toolset.
+        '''
+        prefix = [library]
+        if test_name is not None:
+            prefix.append(test_name)
+            if toolset is not None:
+                prefix.append(toolset)
+        for test in self.search(self.by_library,prefix):
+            if toolset is None or test.toolset == toolset:
+                yield test
+
+    def toolset_tests(self, toolset, library = None):
+        '''
+        The tests for the toolset, optionally only those of the library.
+        '''
+        prefix = [toolset]
+        if library is not None:
+            prefix.append(library)
+        return self.search(self.by_toolset,prefix)
+
+class PackTest(object):
+    '''
+    A test of a result pack. The strings are read when accessed.
+    '''
+
+    __slots__ = ('pack','record')
+
+    def __init__(self, pack, record):
+        self.pack = pack
+        self.record = record
+
+    library = property(lambda self: self.pack.string(self.record[0]))
+    test_name = property(lambda self: self.pack.string(self.record[1]))
+    test_type = property(lambda self: self.pack.string(self.record[2]))
+    toolset = property(lambda self: self.pack.string(self.record[3]))
+    target_directory = property(lambda self: self.pack.string(self.record[4]))
+    result = property(lambda self: self.pack.string(self.record[5]))
+
+    @property
+    def actions(self):
+        return [ self.pack.action(i)
+            for i in xrange(self.record[6],self.record[6]+self.record[7]) ]
+
+class PackAction(object):
+    '''
+    An action of a test in a result pack. The strings, and the command and
+    output, are read when accessed.
+    '''
+
+    __slots__ = ('pack','record')
+
+    def __init__(self, pack, record):
+        self.pack = pack
+        self.record = record
+
+    type = property(lambda self: self.pack.string(self.record[0]))
+    result = property(lambda self: self.pack.string(self.record[1]))
+    name = property(lambda self: self.pack.string(self.record[2]))
+    path = property(lambda self: self.pack.string(self.record[3]))
+    start = property(lambda self: self.pack.string(self.record[4]))
+    end = property(lambda self: self.pack.string(self.record[5]))
+    user = property(lambda self: self.pack.string(self.record[6]))
+    system = property(lambda self: self.pack.string(self.record[7]))
+    command = property(lambda self: self.pack.blob(self.record[8],self.record[9]))
+    output = property(lambda self: self.pack.blob(self.record[10],self.record[11]))
+
+def main(args = None):
+    opt = optparse.OptionParser(
+        usage="%prog [options] pack [library [test [toolset]]]")
+    opt.add_option( '--toolset',
+        help="only the tests for the toolset" )
+    opt.add_option( '--output',
+        help="print the command and output of the actions",
+        action='store_true' )
+    ( options, args ) = opt.parse_args(args)
+    if not args:
+        opt.error("no result pack given")
+    pack = PackReader(args[0])
+    if len(args) > 1:
+        tests = pack.find(*args[1:4])
+    elif options.toolset:
+        tests = pack.toolset_tests(options.toolset)
+    else:
+        tests = iter(pack)
+    for test in tests:
+        if options.toolset and test.toolset != options.toolset:
+            continue
+        print ("%s/%s %s %s %s" % (test.library,test.test_name,test.toolset,
+            test.test_type,test.result)).encode('utf-8')
+        if options.output:
+            for action in test.actions:
+                print ("  (%s %s) %s" % (action.type,action.result,action.path)).encode('utf-8')
+                for text in (action.command,action.output):
+                    if text.strip():
+                        print text.strip().encode('utf-8')
+    pack.close()
+
+if __name__ == '__main__':
+    main()
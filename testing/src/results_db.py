@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+
+# Distributed under the Boost Software License, Version 1.0.
+# (See accompanying file LICENSE_1_0.txt or copy at
+# http://www.boost.org/LICENSE_1_0.txt)
+
+'''
+SQLite store of the test results of many runs, for querying the history
+of results without re-parsing the logs. The tests and actions read by
+build_log.BuildOutputProcessor are loaded for a run, identified by the
+runner and revision.
+
+Usage:
+
+    results_db.py [options] database ingest --runner=ID --revision=REV log.xml...
+    results_db.py [options] database runs
+    results_db.py [options] database tests [--library=L] [--toolset=T] [--test=N] [--result=R] [--last=N]
+    results_db.py [options] database output --runner=ID --revision=REV library/test
+'''
+
+import optparse
+import sqlite3
+import sys
+import time
+
+_schema = '''
+create table if not exists runs (
+    id integer primary key,
+    runner text not null,
+    revision text not null,
+    tag text,
+    timestamp text,
+    ingested real,
+    unique (runner, revision) );
+create table if not exists tests (
+    id integer primary key,
+    run integer not null references runs (id),
+    library text,
+    test text,
+    type text,
+    toolset text,
+    result text );
+create table if not exists actions (
+    test integer not null references tests (id),
+    type text,
+    result text,
+    name text,
+    path text,
+    start text,
+    end text,
+    user text,
+    system text,
+    command text,
+    output text );
+create index if not exists tests_run on tests (run);
+create index if not exists tests_library on tests (library, test);
+create index if not exists tests_test on tests (test);
+create index if not exists tests_toolset on tests (toolset, result);
+create index if not exists tests_result on tests (result);
+create index if not exists actions_test on actions (test);
+'''
+
+class ResultsDatabase(object):
+    '''
+    The results database, created as needed.
+    '''
+
+    batch_size = 1000
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(_schema)
+
+    def close(self):
+        self.db.close()
+
+    def ingest(self, bop, runner, revision, tag = None, timestamp = None):
+        '''
+        Load the tests and actions of the BuildOutputProcessor as the run of
+        the runner at the revision, replacing any earlier load of that run.
+        A test has a row for each toolset it was built with.
+        All of it is done in a single transaction, with batched inserts.
+        '''
+        if timestamp is None and bop.timestamps:
+            timestamp = bop.timestamps[0]
+        db = self.db
+        try:
+            self.delete_run(runner,revision)
+            run = db.execute(
+                'insert into runs (runner, revision, tag, timestamp, ingested) values (?,?,?,?,?)',
+                (runner,revision,tag,timestamp,time.time())).lastrowid
+            test_id = (db.execute('select max(id) from tests').fetchone()[0] or 0)+1
+            tests = []
+            actions = []
+            for name in sorted(bop.test.keys()):
+                test = bop.test[name]
+                for (toolset,test_actions,result) in test.runs():
+                    tests.append((test_id,run,test.library,test.test_name,test.test_type,
+                        toolset,result))
+                    for action in test_actions:
+                        actions.append((test_id,action.type,action.result,action.name,
+                            action.path,action.time_start,action.time_end,
+                            action.time_user,action.time_system,action.command,action.output))
+                    test_id += 1
+                if len(tests) >= self.batch_size:
+                    self.insert(tests,actions)
+            self.insert(tests,actions)
+            db.commit()
+        except:
+            db.rollback()
+            raise
+        return run
+
+    def insert(self, tests, actions):
+        self.db.executemany('insert into tests values (?,?,?,?,?,?,?)',tests)
+        self.db.executemany('insert into actions values (?,?,?,?,?,?,?,?,?,?,?)',actions)
+        del tests[:]
+        del actions[:]
+
+    def delete_run(self, runner, revision):
+        for (run,) in self.db.execute(
+            'select id from runs where runner = ? and revision = ?',(runner,revision)).fetchall():
+            self.db.execute(
+                'delete from actions where test in (select id from tests where run = ?)',(run,))
+            self.db.execute('delete from tests where run = ?',(run,))
+            self.db.execute('delete from runs where id = ?',(run,))
+
+    def runs(self, last = None):
+        '''
+        The (id, runner, revision, tag, timestamp) of the runs, the latest
+        loaded first.
+        '''
+        sql = 'select id, runner, revision, tag, timestamp from runs order by id desc'
+        if last:
+            return self.db.execute(sql+' limit ?',(last,)).fetchall()
+        return self.db.execute(sql).fetchall()
+
+    def tests(self, library = None, test = None, toolset = None, result = None, last = None):
+        '''
+        The (runner, revision, library, test, toolset, result) of the tests
+        matching all the given fields, in the given number of latest runs.
+        '''
+        where = []
+        args = []
+        for (column,value) in (('t.library',library),('t.test',test),
+            ('t.toolset',toolset),('t.result',result)):
+            if value is not None:
+                where.append('%s = ?' % column)
+                args.append(value)
+        if last:
+            where.append('t.run in (select id from runs order by id desc limit ?)')
+            args.append(last)
+        sql = '''select r.runner, r.revision, t.library, t.test, t.toolset, t.result
+            from tests t join runs r on t.run = r.id'''
+        if where:
+            sql += ' where '+' and '.join(where)
+        sql += ' order by r.id desc, t.library, t.test, t.toolset'
+        return self.db.execute(sql,args).fetchall()
+
+    def actions(self, runner, revision, library, test):
+        '''
+        The (toolset, type, result, path, command, output) of the actions of
+        the test in the run.
+        '''
+        return self.db.execute('''select t.toolset, a.type, a.result, a.path, a.command, a.output
+            from actions a join tests t on a.test = t.id join runs r on t.run = r.id
+            where r.runner = ? and r.revision = ? and t.library = ? and t.test = ?
+            order by t.toolset, a.rowid''',(runner,revision,library,test)).fetchall()
+
+def main(args = None):
+    opt = optparse.OptionParser(
+        usage="%prog [options] database ingest|runs|tests|output [input...]")
+    opt.add_option( '--runner',
+        help="runner ID of the run" )
+    opt.add_option( '--revision',
+        help="revision of the run" )
+    opt.add_option( '--tag',
+        help="the tag of the run, when ingesting" )
+    opt.add_option( '--library' )
+    opt.add_option( '--toolset' )
+    opt.add_option( '--test' )
+    opt.add_option( '--result',
+        help="'succeed' or 'fail'" )
+    opt.add_option( '--last',
+        help="only the given number of latest runs",
+        type='int' )
+    ( options, args ) = opt.parse_args(args)
+    if len(args) < 2:
+        opt.error("a database and a command are needed")
+    (database,command,inputs) = (args[0],args[1],args[2:])
+    db = ResultsDatabase(database)
+    if command == 'ingest':
+        from build_log import BuildOutputProcessor
+        if not options.runner or not options.revision or not inputs:
+            opt.error("ingest needs --runner, --revision, and the logs")
+        start = time.time()
+        bop = BuildOutputProcessor(inputs)
+        parsed = time.time()
+        db.ingest(bop,options.runner,options.revision,tag=options.tag)
+        sys.stderr.write("Parsed in %.2fs, ingested in %.2fs.\n" % (parsed-start,time.time()-parsed))
+    elif command == 'runs':
+        for run in db.runs(last=options.last):
+            print '\t'.join([ unicode(x) for x in run ]).encode('utf-8')
+    elif command == 'tests':
+        for test in db.tests(library=options.library,test=options.test,
+            toolset=options.toolset,result=options.result,last=options.last):
+            print '\t'.join(test).encode('utf-8')
+    elif command == 'output':
+        if not options.runner or not options.revision or not inputs:
+            opt.error("output needs --runner, --revision, and the library/test")
+        (library,test) = inputs[0].rsplit('/',1)
+        for (toolset,type,result,path,command_text,output) in db.actions(
+            options.runner,options.revision,library,test):
+            print ("(%s %s %s) %s" % (toolset,type,result,path)).encode('utf-8')
+            for text in (command_text,output):
+                if text and text.strip():
+                    print text.strip().encode('utf-8')
+    else:
+        opt.error("unknown command '%s'" % command)
+    db.close()
+
+if __name__ == '__main__':
+    main()
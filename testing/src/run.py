@@ -31,7 +31,7 @@ else:
     root = os.path.abspath(os.path.dirname(os.path.realpath(__file__)))
 print '# Running regressions in %s...' % root
 
-script_sources = [ 'collect_and_upload_logs.py', 'process_jam_log.py', 'regression.py' ]
+script_sources = [ 'bjam_log.py', 'collect_and_upload_logs.py', 'process_jam_log.py', 'regression.py', 'result_pack.py' ]
 script_local = root
 if use_local:
     script_remote = 'file://'+os.path.abspath(os.path.dirname(os.path.realpath(__file__)))